@@ -2,18 +2,40 @@ import logging
 import time
 from collections import OrderedDict
 from configparser import RawConfigParser
-from functools import wraps
+from functools import partial, wraps
 from os import environ
 from pathlib import Path
 
 
-def timeit(func):
+def timeit(func=None, *, metric: str | None = None, **labels):
+    """Time each call of func.
+
+    Used as @timeit, the time is logged. Used as @timeit(metric=name, **labels),
+    the time is observed in the histogram called name in dslsplit.metrics with
+    the given label values instead, and only logged at debug level.
+    """
+    if func is None:
+        return partial(timeit, metric=metric, **labels)
+
+    if metric is None:
+        observe = None
+    else:
+        from dslsplit.metrics import REGISTRY
+
+        histogram = REGISTRY.metrics[metric]
+        label_values = tuple(labels[name] for name in histogram.labelnames)
+        observe = partial(histogram.observe, labels=label_values)
+
     @wraps(func)
     def wrapper(*args, **kwargs):
         start = time.perf_counter()
         result = func(*args, **kwargs)
         end = time.perf_counter()
-        logger.info(f"{func.__name__} took {end - start:.6f} seconds to complete")
+        if observe is None:
+            logger.info(f"{func.__name__} took {end - start:.6f} seconds to complete")
+        else:
+            observe(end - start)
+            logger.debug(f"{func.__name__} took {end - start:.6f} seconds to complete")
         return result
 
     return wrapper
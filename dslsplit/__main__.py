@@ -0,0 +1,3 @@
+from dslsplit.cli import main
+
+main()
@@ -1,17 +1,48 @@
 """FastAPI service for wordres."""
+import asyncio
+import secrets
+import signal
+import time
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timezone
 from os import environ
-import pandas as pd
-from fastapi import Depends, FastAPI
+from threading import Lock, Thread
+from typing import Any, Dict, Iterator, List, Literal
+from fastapi import Depends, FastAPI, HTTPException, Query, Security, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.security import APIKeyHeader
 from fastapi_simple_security import api_key_router, api_key_security
-from pathlib import Path
+from pydantic import BaseModel, Field
 from starlette.responses import PlainTextResponse
 
 from dslsplit import CONFIG, logger
-from dslsplit.brute_split import load_probabilities, split_compound
-from dslsplit.train_splitter import train_splitter
-from dslsplit.splitter import Splitter2
+from dslsplit.executor import QueueFullError, executor_from_config
+from dslsplit.metrics import (
+    HTTP_REQUEST_SECONDS,
+    HTTP_REQUESTS,
+    REGISTRY,
+    WORDS,
+    render_cache_stats,
+)
+from dslsplit.pipeline import (
+    LANGUAGES,
+    MAX_PARTS,
+    METHODS,
+    RESULT_CACHE,
+    VARIANTS,
+    check_parameters,
+    compute_splits,
+    reload_models,
+    result_key,
+    split_word,
+    warm_up,
+)
+from dslsplit.responses import FastJSONResponse
+
+# Supported parameter values, so other values are rejected with a 422
+Method = Literal[METHODS]
+Variant = Literal[VARIANTS]
+Language = Literal[LANGUAGES]
 
 
 enable_security = environ.get("ENABLE_SECURITY")
@@ -26,14 +57,111 @@ logger.info(f"Security: {security_str}")
 
 title = CONFIG.get("splitter", "title")
 description = CONFIG.get("splitter", "description")
-# compound_split_probabilities = CONFIG.get("splitter", "prob_file")
-current_dir = current_dir = Path(__file__).resolve().parent
-word_file_path = str(current_dir / CONFIG.get("splitter", "word_file"))
+max_batch_size = CONFIG.getint("splitter", "max_batch_size", fallback=10000)
+chunk_size = CONFIG.getint("executor", "chunk_size", fallback=500)
+
+split_executor = executor_from_config()
+
+_reload_lock = Lock()
+# State of the last model reload, as returned by /admin/reload
+reload_status: Dict[str, Any] = {"state": "idle"}
+
+
+secret_header = APIKeyHeader(
+    name="secret-key", scheme_name="Secret header", auto_error=False
+)
+
+
+def secret_security(secret_key: str | None = Security(secret_header)) -> None:
+    """Require the secret-key header to match FASTAPI_SIMPLE_SECURITY_SECRET.
+
+    Without the environment variable, every request is rejected.
+    """
+    secret = environ.get("FASTAPI_SIMPLE_SECURITY_SECRET", "")
+    if not (
+        secret
+        and secret_key
+        and secrets.compare_digest(secret_key.encode(), secret.encode())
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Missing or wrong secret-key header",
+        )
+
+
+def now() -> str:
+    """Return the current UTC time in ISO format."""
+    return datetime.now(timezone.utc).isoformat()
+
+
+def reload_in_background(force_training: bool = False) -> bool:
+    """Reload the models in a background thread while requests are served.
+
+    The new models are loaded and validated before they replace the current
+    ones, and with the process backend the worker processes are replaced.
+
+    Args:
+        force_training: If True, rebuild the model artifact first.
+
+    Returns:
+        False if a reload is already running.
+    """
+    if not _reload_lock.acquire(blocking=False):
+        return False
+    reload_status.clear()
+    reload_status.update(state="running", started=now(), force_training=force_training)
+    Thread(
+        target=_reload, args=(force_training,), name="reload-models", daemon=True
+    ).start()
+    return True
+
+
+def _reload(force_training: bool) -> None:
+    try:
+        model = reload_models(force_training)
+        split_executor.restart()
+        reload_status.update(state="done", model=str(model.path))
+    except Exception as error:
+        logger.exception("Reloading the models failed, keeping the current models")
+        reload_status.update(state="failed", error=str(error))
+    finally:
+        reload_status["finished"] = now()
+        _reload_lock.release()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load the warm-up models and shut down the execution backend when the app stops.
+
+    With the process backend the models are only needed in the worker
+    processes, which load them when they start. The pool is started before
+    requests are served, so the model artifact is not built on the event loop.
+    SIGHUP reloads the models.
+    """
+    if split_executor.backend == "thread":
+        warm_up()
+    else:
+        split_executor.start()
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGHUP, reload_in_background)
+    except (AttributeError, NotImplementedError, RuntimeError, ValueError):
+        # No SIGHUP on Windows, and only the main thread can handle signals
+        logger.info("Not reloading the models on SIGHUP")
+        sighup = False
+    else:
+        sighup = True
+    yield
+    if sighup:
+        loop.remove_signal_handler(signal.SIGHUP)
+    split_executor.shutdown()
 
 
 app = FastAPI(
     title=title,
     description="description",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 if CONFIG.has_option("webservice", "origin"):
@@ -53,27 +181,93 @@ def healthcheck() -> str:
     return "200"
 
 
-logger.info(f'Train splitter with "{word_file_path}"')
-compound_split_probabilities = train_splitter(word_file_path, "careful", lang="da")
-lemmas = pd.read_csv(word_file_path, sep=";", usecols=[0], names=["name"])
-lemmas = lemmas.name.drop_duplicates().values
+@contextmanager
+def observe_request(endpoint: str, method: str, variant: str) -> Iterator[None]:
+    """Count a split request by status code and observe its latency."""
+    # Unsupported values are not used as labels, to bound the number of series
+    method = method if method in METHODS else "unsupported"
+    variant = variant if variant in VARIANTS else "unsupported"
+    start = time.perf_counter()
+    status_code = status.HTTP_200_OK
+    try:
+        yield
+    except HTTPException as error:
+        status_code = error.status_code
+        raise
+    except Exception:
+        status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+        raise
+    finally:
+        HTTP_REQUESTS.inc((endpoint, method, variant, str(status_code)))
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start, (endpoint, method, variant)
+        )
 
-splitter = Splitter2(language="da", lemma_list=list(lemmas)).load_from_filepath(
-    compound_split_probabilities
-)
 
+async def split_words(
+    words: List[str],
+    method: str,
+    variant: str,
+    lang: str,
+    max_parts: int = 2,
+    top_k: int | None = None,
+) -> List[bytes]:
+    """Split words using the result cache and the execution backend.
+
+    Each unique word not in the cache is split once in the execution backend.
+
+    Returns:
+        List with the response for each word as JSON, in input order.
+    """
+    check_parameters(method, variant, lang, max_parts, top_k)
+    keys = {
+        word: result_key(word, method, variant, lang, max_parts, top_k)
+        for word in words
+    }
+    results = {}
+    missing = []
+    # Results computed with models replaced meanwhile are not cached
+    generation = RESULT_CACHE.generation
+    for key in dict.fromkeys(keys.values()):
+        result = RESULT_CACHE.get(key)
+        if result is None:
+            missing.append(key)
+        else:
+            results[key] = result
+
+    cache = {key: "hit" for key in results}
+    if missing:
+        try:
+            computed = await split_executor.run_chunked(
+                compute_splits, missing, chunk_size
+            )
+        except QueueFullError as error:
+            raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, str(error))
+        for key, result in zip(missing, computed):
+            RESULT_CACHE.put(key, result, generation)
+            results[key] = result
+            cache[key] = "miss"
 
-brute_probabilities = load_probabilities()
+    for word in words:
+        key = keys[word]
+        WORDS.inc((method, results[key].method, variant, cache[key]))
+    return [results[keys[word]].to_json(word) for word in words]
 
 
 @app.get(
     "/split/{word}",
-    response_class=JSONResponse,
+    response_class=FastJSONResponse,
     dependencies=[Depends(api_key_security)],
 )
 async def split(
-    word: str, method: str = "mixed", variant: str = "nudansk", lang: str = "da"
-) -> JSONResponse:
+    word: str,
+    method: Method = "mixed",
+    variant: Variant = "nudansk",
+    lang: Language = "da",
+    max_parts: int = Query(2, ge=2, le=MAX_PARTS),
+    debug: bool = False,
+    top_k: int | None = Query(None, ge=1),
+) -> FastJSONResponse:
     """
     Return word split into tokens and scores and scores for each possible split
 
@@ -82,38 +276,128 @@ async def split(
         **lang**: language (Only "da" for Danish is supported)
         **method**: "mixed" (default), "careful" or "brute"
         **variant**: "nudansk" (default) or "yngrenydansk"
+        **max_parts**: maximum number of parts (default 2). With more than two parts, "fuges" holds the joint element between each pair of parts
+        **debug**: if true, add the score of each pentagram of each brute candidate as "trace"
+        **top_k**: if given, only return the top_k best splits, which is faster than returning all
 
     Returns:
         Dictionary with keys "word", possible "splits", "description" and "method".
     """
-    if method not in ("mixed", "careful", "brute"):
-        raise ValueError(f"Method {method} not supported")
-    if variant not in ("nudansk", "yngrenydansk"):
-        raise ValueError(f"Variant {variant} not supported")
-    if lang not in ("da"):
-        raise ValueError(f"Language {lang} not supported")
-
-    splits = {}
-    if method in ("careful", "mixed"):
-        splitter.language = lang
-        splits = splitter.easy_split(word)
-        splits = [split for split in splits if split["score"] > 0]
-        if splits:
-            method = "careful"
-    if not splits and method not in ("careful",):
-        brute_split = split_compound(word, brute_probabilities[variant])
-        splits = brute_split.get("splits", [])
-        method = "brute"
-
-    message = {
-        "word": word,
-        "splits": splits,
-        "method": method,
-        "description": CONFIG.has_option(method, "description")
-        and CONFIG.get(method, "description")
-        or "",
-    }
-    return JSONResponse(content=message)
+    with observe_request("/split/{word}", method, variant):
+        if debug:
+            try:
+                message = await split_executor.run(
+                    split_word,
+                    word,
+                    method,
+                    variant,
+                    lang,
+                    max_parts,
+                    debug=True,
+                    top_k=top_k,
+                )
+            except QueueFullError as error:
+                raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, str(error))
+            return FastJSONResponse(content=message)
+
+        messages = await split_words([word], method, variant, lang, max_parts, top_k)
+        return FastJSONResponse(content=messages[0])
+
+
+class SplitRequest(BaseModel):
+    """Body of a batch split request."""
+
+    words: List[str]
+    method: Method = "mixed"
+    variant: Variant = "nudansk"
+    lang: Language = "da"
+    max_parts: int = Field(2, ge=2, le=MAX_PARTS)
+    top_k: int | None = Field(None, ge=1)
+
+
+@app.post(
+    "/split",
+    response_class=FastJSONResponse,
+    dependencies=[Depends(api_key_security)],
+)
+async def split_batch(request: SplitRequest) -> FastJSONResponse:
+    """
+    Split many words in one request
+
+    Args:
+        **words**: words to split into subtokens
+        **lang**: language (Only "da" for Danish is supported)
+        **method**: "mixed" (default), "careful" or "brute"
+        **variant**: "nudansk" (default) or "yngrenydansk"
+        **max_parts**: maximum number of parts (default 2)
+        **top_k**: if given, only return the top_k best splits of each word
+
+    Returns:
+        List with a dictionary as returned by /split/{word} for each word, in input order.
+    """
+    with observe_request("/split", request.method, request.variant):
+        if len(request.words) > max_batch_size:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"At most {max_batch_size} words per request",
+            )
+        messages = await split_words(
+            request.words,
+            request.method,
+            request.variant,
+            request.lang,
+            request.max_parts,
+            request.top_k,
+        )
+        return FastJSONResponse(content=b"[" + b",".join(messages) + b"]")
+
+
+@app.get("/cache", dependencies=[Depends(api_key_security)])
+def cache_stats() -> Dict[str, int]:
+    """Return size and hit, miss and eviction counters of the result cache."""
+    return RESULT_CACHE.stats()
+
+
+@app.post(
+    "/admin/reload",
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(secret_security)],
+)
+def reload(force_training: bool = False) -> Dict[str, Any]:
+    """
+    Reload the models without downtime
+
+    The models are loaded (and with **force_training** rebuilt first) and
+    validated in the background, and then replace the current models. Requests
+    being served finish with the current models, and the result cache is
+    cleared. Requires the secret-key header.
+
+    Returns:
+        State of the reload, as returned by GET /admin/reload.
+    """
+    if not reload_in_background(force_training):
+        raise HTTPException(status.HTTP_409_CONFLICT, "A reload is already running")
+    return dict(reload_status)
+
+
+@app.get("/admin/reload", dependencies=[Depends(secret_security)])
+def reload_state() -> Dict[str, Any]:
+    """Return the state of the last reload: idle, running, done or failed."""
+    return dict(reload_status)
+
+
+@app.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    dependencies=[Depends(api_key_security)],
+)
+def metrics() -> PlainTextResponse:
+    """Return request counts, latency histograms, per-stage timings, model load
+    times and result cache statistics in the Prometheus text format."""
+    return PlainTextResponse(
+        REGISTRY.render() + render_cache_stats(RESULT_CACHE.stats()),
+        media_type="text/plain; version=0.0.4",
+    )
 
 
 if not enable_security:
@@ -0,0 +1,254 @@
+"""Micro-benchmarks of the splitting hot paths, model loading and training.
+
+The splitting benchmarks run on words drawn from the evaluation data and the
+compound lists, bucketed by word length. Results are written as JSON, and a run
+can be compared with an earlier one to flag regressions:
+
+    dslsplit bench --output bench.json
+    dslsplit bench --baseline bench.json --threshold 0.1
+"""
+import csv
+import json
+import platform
+import random
+import statistics
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from dslsplit.brute_split import data_files, split_compound, train_variant
+from dslsplit.model import load_model, read_model, word_file
+from dslsplit.pipeline import get_brute, get_splitter
+from dslsplit.train_splitter import train_careful
+
+current_dir = Path(__file__).parent.resolve()
+EVALUATION_FILE = current_dir / "evaluation_data.csv"
+# Word length buckets as (label, shortest, longest)
+BUCKETS = (
+    ("1-6", 1, 6),
+    ("7-10", 7, 10),
+    ("11-14", 11, 14),
+    ("15-19", 15, 19),
+    ("20+", 20, 1000),
+)
+SPLIT_BENCHMARKS = (
+    "careful.split_compound",
+    "careful.easy_split",
+    "brute.split_compound",
+)
+OTHER_BENCHMARKS = ("load.mmap", "load.memory", "train.careful", "train.brute")
+BENCHMARKS = SPLIT_BENCHMARKS + OTHER_BENCHMARKS
+
+Result = Dict[str, Any]
+
+
+def benchmark_words() -> List[str]:
+    """Return the unique words of the evaluation data and the compound lists."""
+    words = []
+    with open(EVALUATION_FILE, encoding="utf8") as f:
+        words += [row[0] for row in csv.reader(f, delimiter=";") if row]
+    for filepath in sorted({filepath for filepath, _ in data_files("nudansk")}):
+        with open(filepath, encoding="utf8") as f:
+            words += [line.strip().replace("+", "") for line in f]
+    return list(dict.fromkeys(word for word in words if word))
+
+
+def sample_words(
+    words: Iterable[str], per_bucket: int = 50, seed: int = 0
+) -> Dict[str, List[str]]:
+    """Draw the same random words for each length bucket in every run.
+
+    Args:
+        words: Words to draw from.
+        per_bucket: Maximum number of words in each bucket.
+        seed: Seed of the random sample.
+
+    Returns:
+        Dictionary with the words of each bucket label.
+    """
+    buckets = {label: [] for label, _, _ in BUCKETS}
+    for word in words:
+        for label, shortest, longest in BUCKETS:
+            if shortest <= len(word) <= longest:
+                buckets[label].append(word)
+                break
+    rng = random.Random(seed)
+    return {
+        label: rng.sample(sorted(bucket), min(per_bucket, len(bucket)))
+        for label, bucket in buckets.items()
+    }
+
+
+def measure(func: Callable[[], Any], repeat: int) -> List[float]:
+    """Return the wall time of each of repeat calls of func in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def make_result(
+    name: str, times: List[float], unit: str, bucket: str | None = None, **extra
+) -> Result:
+    """Summarise the times of a benchmark."""
+    return {
+        "name": name,
+        "bucket": bucket,
+        "unit": unit,
+        "median": statistics.median(times),
+        "min": min(times),
+        "repeat": len(times),
+        **extra,
+    }
+
+
+def split_benchmarks(
+    names: Iterable[str], buckets: Dict[str, List[str]], repeat: int
+) -> List[Result]:
+    """Time the splitting functions per word in each bucket, in microseconds."""
+    splitter = get_splitter()
+    splitter.language = "da"
+    probabilities = get_brute("nudansk")
+    functions = {
+        "careful.split_compound": splitter.split_compound,
+        "careful.easy_split": splitter.easy_split,
+        "brute.split_compound": lambda word: split_compound(word, probabilities),
+    }
+    results = []
+    for name in names:
+        func = functions[name]
+        for bucket, words in buckets.items():
+            if not words:
+                continue
+            # Warm up, so one-off costs such as first page faults are not timed
+            for word in words:
+                func(word)
+            times = measure(lambda: [func(word) for word in words], repeat)
+            times = [elapsed / len(words) * 1e6 for elapsed in times]
+            results.append(
+                make_result(name, times, "us/word", bucket, words=len(words))
+            )
+    return results
+
+
+def load_benchmark(storage: str, repeat: int) -> Result:
+    """Time reading the artifact and loading the careful and nudansk models."""
+    path = load_model().path
+
+    def load() -> None:
+        model = read_model(path, storage=storage)
+        model.careful, model.lemmas, model.brute["nudansk"]
+
+    return make_result(f"load.{storage}", measure(load, repeat), "s")
+
+
+def run_benchmarks(
+    names: Iterable[str] = BENCHMARKS,
+    per_bucket: int = 50,
+    repeat: int = 5,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """Run benchmarks.
+
+    Args:
+        names: Benchmarks to run, see BENCHMARKS.
+        per_bucket: Number of words in each length bucket.
+        repeat: Number of timed runs of each benchmark. Training runs once.
+        seed: Seed of the word sample.
+
+    Returns:
+        Dictionary with information on the run and the results.
+    """
+    names = list(names)
+    for name in names:
+        if name not in BENCHMARKS:
+            raise ValueError(f"Benchmark {name} not supported")
+    buckets = sample_words(benchmark_words(), per_bucket, seed)
+
+    results = split_benchmarks(
+        [name for name in names if name in SPLIT_BENCHMARKS], buckets, repeat
+    )
+    for storage in ("mmap", "memory"):
+        if f"load.{storage}" in names:
+            results.append(load_benchmark(storage, repeat))
+    if "train.careful" in names:
+        times = measure(lambda: train_careful(word_file()), 1)
+        results.append(make_result("train.careful", times, "s"))
+    if "train.brute" in names:
+        times = measure(lambda: train_variant("nudansk", workers=1), 1)
+        results.append(make_result("train.brute", times, "s"))
+
+    return {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "per_bucket": per_bucket,
+        "repeat": repeat,
+        "seed": seed,
+        "results": results,
+    }
+
+
+def result_key(result: Result) -> Tuple[str, str | None]:
+    return result["name"], result["bucket"]
+
+
+def compare(
+    run: Dict[str, Any], baseline: Dict[str, Any], threshold: float = 0.1
+) -> List[Dict[str, Any]]:
+    """Return the results of run that are slower than in baseline.
+
+    Args:
+        run: Run as returned by run_benchmarks.
+        baseline: Earlier run to compare with.
+        threshold: Relative slowdown of the median time that counts as a
+            regression, e.g. 0.1 for 10%.
+
+    Returns:
+        List with name, bucket, baseline and current median time and the
+        relative change of each regression.
+    """
+    baseline_results = {result_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in run["results"]:
+        old = baseline_results.get(result_key(result))
+        if old is None or not old["median"]:
+            continue
+        change = result["median"] / old["median"] - 1
+        if change > threshold:
+            regressions.append(
+                {
+                    "name": result["name"],
+                    "bucket": result["bucket"],
+                    "baseline": old["median"],
+                    "median": result["median"],
+                    "change": change,
+                }
+            )
+    return regressions
+
+
+def format_results(run: Dict[str, Any]) -> str:
+    """Format the results of a run as a table."""
+    lines = [f"{'benchmark':<24}{'bucket':>8}{'median':>12}{'min':>12}  unit"]
+    for result in run["results"]:
+        lines.append(
+            f"{result['name']:<24}{result['bucket'] or '':>8}"
+            f"{result['median']:>12.4g}{result['min']:>12.4g}  {result['unit']}"
+        )
+    return "\n".join(lines)
+
+
+def write_run(run: Dict[str, Any], path: str | Path) -> None:
+    """Write a run as JSON."""
+    with open(path, "w", encoding="utf8") as f:
+        json.dump(run, f, indent=2)
+
+
+def read_run(path: str | Path) -> Dict[str, Any]:
+    """Read a run written by write_run."""
+    with open(path, encoding="utf8") as f:
+        return json.load(f)
@@ -1,39 +1,100 @@
 import os
 import pickle
 import tempfile
-from collections import defaultdict
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from heapq import nlargest
+from itertools import chain, islice
+from math import exp, log
+from operator import itemgetter
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Tuple
 
 from dslsplit import CONFIG, logger, timeit
+from dslsplit.decompose import decompose
 
 current_dir = Path(__file__).parent.resolve()
+# Number of compounds counted at a time when training
+TRAINING_CHUNK_SIZE = 20000
+
+
+def count_pentagrams(data: Iterable[str]) -> Counter:
+    """Count the character pentagrams of compounds padded with "$$" and "__"."""
+    padded = (f"$${compound}__" for compound in data)
+    return Counter(
+        chain.from_iterable(
+            [compound[i : i + 5] for i in range(len(compound) - 4)]
+            for compound in padded
+        )
+    )
+
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Yield lists of up to size items."""
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def count_compounds(
+    data: Iterable[str], workers: int = 1, chunk_size: int = TRAINING_CHUNK_SIZE
+) -> Counter:
+    """Count the pentagrams of compounds.
+
+    The pentagrams are counted in chunks of compounds, optionally in parallel
+    processes, and the counts are merged.
+
+    Args:
+        data: Compounds to count the pentagrams of.
+        workers: Number of processes counting chunks. 1 counts in this process
+            and 0 uses a process for each CPU.
+        chunk_size: Number of compounds in each chunk.
+
+    Returns:
+        Counter of pentagrams.
+    """
+    ngram_counts = Counter()
+    chunks = chunked(data, chunk_size)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for chunk in chunks:
+            ngram_counts.update(count_pentagrams(chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for counts in executor.map(count_pentagrams, chunks):
+                ngram_counts.update(counts)
+    return ngram_counts
+
+
+def pentagram_probabilities(
+    ngram_counts: Mapping[str, int], total: int | None = None
+) -> Dict[str, float]:
+    """Return the probabilities of pentagrams from their counts.
+
+    Args:
+        ngram_counts: Count of each pentagram.
+        total: Total number of pentagrams. Defaults to the sum of the counts.
+    """
+    if total is None:
+        total = sum(ngram_counts.values())
+    return {ngram: count / total for ngram, count in ngram_counts.items()}
 
 
 @timeit
-def train_splitter(data: list) -> Dict[str, float]:
+def train_splitter(
+    data: Iterable[str], workers: int = 1, chunk_size: int = TRAINING_CHUNK_SIZE
+) -> Dict[str, float]:
     """Train the splitter.
 
     Args:
-        data: List of compounds to train the splitter on.
+        data: Compounds to train the splitter on.
+        workers: Number of processes counting pentagrams. See count_compounds.
+        chunk_size: Number of compounds counted at a time.
 
     Returns:
         Dictionary of ngram probabilities."""
-    # Count character pentagrams
-    ngram_counts = defaultdict(int)
-    for compound in data:
-        split_compound = f"$${compound}__"
-        for i in range(2, len(split_compound) - 2):
-            ngram = split_compound[i - 2 : i + 3]
-            ngram_counts[ngram] += 1
-
-    # Calculate ngram probabilities
-    probabilities = {}
-    total_ngrams = sum(ngram_counts.values())
-    for ngram, count in ngram_counts.items():
-        probabilities[ngram] = count / total_ngrams
-
-    return probabilities
+    return pentagram_probabilities(count_compounds(data, workers, chunk_size))
 
 
 @timeit
@@ -45,10 +106,8 @@ def load_probabilities(force_training: bool = False) -> Dict[str, Dict[str, floa
 
     Returns:
         Dictionary with probabilities with each language variant as key."""
-    variants = CONFIG.get("brute", "variants")
     result = {}
-    for variant in variants.split(","):
-        variant = variant.strip()
+    for variant in variants():
         # Try to unpickle ngram probabilities. If that fails, train the splitter
         # and pickle the ngram probabilities.
         pickle_file = os.path.join(
@@ -65,16 +124,7 @@ def load_probabilities(force_training: bool = False) -> Dict[str, Dict[str, floa
             except FileNotFoundError:
                 logger.info("Probabilities not found. Training the splitter...")
 
-        data_files = CONFIG.get(f"brute_{variant}", "data_files").split(",")
-        data_files = [item.split(":") for item in data_files]
-
-        data = []
-        for data_file, preprocess_method in data_files:
-            filepath = current_dir / data_file
-            with open(filepath, "r") as f:
-                data += preprocess_data(f.read().splitlines(), preprocess_method)
-        data = list(set(data))
-        probabilities = train_splitter(data)
+        probabilities = train_variant(variant)
         with open(pickle_file, "wb") as f:
             pickle.dump(probabilities, f)
         result[variant] = probabilities
@@ -82,117 +132,241 @@ def load_probabilities(force_training: bool = False) -> Dict[str, Dict[str, floa
     return result
 
 
-def preprocess_data(data: List[str], todo: str = "") -> List[str]:
+def variants() -> List[str]:
+    """Return the language variants listed in the config."""
+    return [variant.strip() for variant in CONFIG.get("brute", "variants").split(",")]
+
+
+def data_files(variant: str) -> List[Tuple[Path, str]]:
+    """Return the data files of a language variant with their preprocess method."""
+    result = []
+    for item in CONFIG.get(f"brute_{variant}", "data_files").split(","):
+        data_file, preprocess_method = item.split(":")
+        result.append((current_dir / data_file, preprocess_method))
+    return result
+
+
+def iter_compounds(variant: str) -> Iterator[str]:
+    """Yield the unique preprocessed compounds in the data files of a variant.
+
+    The files are read line by line.
+    """
+    seen = set()
+    for filepath, preprocess_method in data_files(variant):
+        with open(filepath, "r") as f:
+            lines = (line.rstrip("\r\n") for line in f)
+            for compound in preprocess_data(lines, preprocess_method):
+                if compound not in seen:
+                    seen.add(compound)
+                    yield compound
+
+
+def train_variant(variant: str, workers: int | None = None) -> Dict[str, float]:
+    """Train the splitter on the data files of a language variant.
+
+    Args:
+        variant: Language variant, e.g. "nudansk".
+        workers: Number of training processes. Defaults to training_workers in
+            the [brute] section of the config. See train_splitter.
+
+    Returns:
+        Dictionary of ngram probabilities.
+    """
+    return train_splitter(iter_compounds(variant), workers=training_workers(workers))
+
+
+def training_workers(workers: int | None = None) -> int:
+    """Return workers, defaulting to training_workers in the [brute] config section."""
+    if workers is None:
+        workers = CONFIG.getint("brute", "training_workers", fallback=1)
+    return workers
+
+
+@lru_cache(maxsize=None)
+def replacement_rules(todo: str) -> Tuple[Tuple[str, str], ...]:
+    """Return the (old, new) replacements of a preprocess method from the config."""
+    replacements = CONFIG.get(f"brute_{todo}", "replacements", fallback="")
+    return tuple(tuple(item.split(":")) for item in replacements.split(",") if item)
+
+
+def preprocess_data(data: Iterable[str], todo: str = "") -> Iterator[str]:
     """Preprocess the data using specification in config file.
 
     Args:
-        data: List of compounds to preprocess.
+        data: Compounds to preprocess.
         todo: What to do with the data. Options are: modernize_danish.
     Returns:
-        List of preprocessed compounds
+        Iterator over the preprocessed compounds
     """
-    output = []
+    replacements = replacement_rules(todo)
     for line in data:
-        if todo == "modernize_danish":
-            # Get all values from CONFIG
-            replacements = CONFIG.get("brute_modernize_danish", "replacements").split(
-                ","
-            )
-            replacements = [item.split(":") for item in replacements]
-            for old, new in replacements:
-                line = line.replace(old, new)
-        output.append(line)
-    return output
+        for old, new in replacements:
+            line = line.replace(old, new)
+        yield line
+
+
+# If a ngram is not in the ngram probability dictionary, assume a very low probability
+VERY_LOW_PROBABILITY = 1e-20
+LOW_PROBABILITY = 1e-10
+LARGE_PROBABILITY = 1
+JOINT_ELEMENTS = ("s", "e", "-")
+# Minimum score for splitting a part further when decomposing into more parts
+MIN_PART_SCORE = CONFIG.getfloat("brute", "min_part_score", fallback=1e-30)
+
+
+@lru_cache(maxsize=256)
+def position_scores(length: int) -> Tuple[Tuple[float, float], ...]:
+    """Return position score and its log weight for each pentagram of a candidate.
+
+    Pentagrams close to the beginning or end of the word are penalized by the
+    square of their position score.
+
+    Args:
+        length: Length of the candidate including the "$$" prefix and "__" suffix.
+
+    Returns:
+        Tuple with (position score, log(position score ** 2)) for each pentagram
+        start position.
+    """
+    center_position = length / 2
+    scores = []
+    for start in range(length - 4):
+        position_score = 1 - abs(start + 2 - center_position) / center_position
+        scores.append((position_score, 2 * log(position_score)))
+    return tuple(scores)
 
 
 # @timeit
 def split_compound(
-    compound: str, probabilities: Dict[str, float]
+    compound: str,
+    probabilities: Dict[str, float],
+    trace: bool = False,
+    max_parts: int = 2,
+    min_part_score: float = MIN_PART_SCORE,
+    top_k: int | None = None,
 ) -> Dict[str, str | List[Dict[str, str | float | List[str]]]]:
     """Split a compound word using probability dictionary.
 
+    A candidate is the compound with a "+" at a split position, or with "+s+",
+    "+e+" or "+-+" replacing a joint element. Its score is the product of the
+    position weighted probabilities of the pentagrams containing a "+". Only
+    those pentagrams are generated, directly from the padded word, and the
+    product is computed as a sum of logarithms to avoid underflow.
+
     Args:
         compound: The compound word to split.
         probabilities: Dictionary of ngram probabilities.
+        trace: If True, add the score of every pentagram of every candidate.
+        max_parts: Maximum number of parts. With more than two parts, the parts
+            of each split are split further where their own best split scores
+            at least min_part_score, and "fuges" holds the joint element between
+            each pair of parts.
+        min_part_score: Minimum score for splitting a part further.
+        top_k: If given, only the top_k best splits are selected, with a heap.
+            With more than two parts, splits are split further until there are
+            top_k different decompositions.
 
     Returns:
-        Dictionary with the following keys: word, splits, description, method.
+        Dictionary with the following keys: word, splits and, if trace is True,
+        trace with a dictionary for each candidate with the keys candidate,
+        pentagrams and score.
     """
-    # If a ngram is not in the ngram probability dictionary, assume a very low probability
-    very_low_probability = 1e-20
-    low_probability = 1e-10
-    large_probability = 1
-
-    # Generate list of candidates
-    candidates = []
-    # Add candidates with plus sign between each character
-    for i in range(1, len(compound)):
-        candidate = compound[:i] + "+" + compound[i:]
-        candidates.append(candidate)
-    # Add candidates with plus sign on both sides of s and e
+    padded = "$$" + compound + "__"
+
+    # Candidates as (split position, joint element)
+    candidates = [(i, "") for i in range(1, len(compound))]
     for i in range(1, len(compound) - 1):
-        if compound[i] == "s" and compound[i - 1] != "+" and compound[i + 1] != "+":
-            candidate = compound[:i] + "+s+" + compound[i + 1 :]
-            candidates.append(candidate)
-        elif compound[i] == "e" and compound[i - 1] != "+" and compound[i + 1] != "+":
-            candidate = compound[:i] + "+e+" + compound[i + 1 :]
-            candidates.append(candidate)
-        elif compound[i] == "-" and compound[i - 1] != "+" and compound[i + 1] != "+":
-            candidate = compound[:i] + "+-+" + compound[i + 1 :]
-            candidates.append(candidate)
-
-    # Calculate scores for each candidate
-    scores = []
-    for candidate in candidates:
-        print("====", candidate, "====")
+        if (
+            compound[i] in JOINT_ELEMENTS
+            and compound[i - 1] != "+"
+            and compound[i + 1] != "+"
+        ):
+            candidates.append((i, compound[i]))
+
+    results = []
+    candidate_traces = []
+    for i, joint_element in candidates:
+        # Position of the first "+" in the padded candidate
+        plus_position = i + 2
+        marker = f"+{joint_element}+" if joint_element else "+"
+        first = max(0, plus_position - 4)
+        after = plus_position + len(joint_element)
+        # Every pentagram of this window contains a "+"
+        window = padded[first:plus_position] + marker + padded[after : after + 4]
+        weights = position_scores(len(padded) + len(marker) - len(joint_element))
+
+        pentagram_traces = []
         pentagrams_not_found = 0
-        score = 1
-        split_compound = "$$" + candidate + "__"
-        center_position = len(split_compound) / 2
-        for i in range(2, len(split_compound) - 2):
-            pentagram = split_compound[i - 2 : i + 3]
-            if "+" not in pentagram:
-                continue
-            if not pentagram in probabilities and "+-+" not in pentagram:
-                pentagrams_not_found += 1
-            if "+-+" in pentagram or pentagram[0:2] == "-+" or pentagram[-2:] == "+-":
-                penta_prob = large_probability
-            elif pentagram in probabilities:
-                penta_prob = probabilities[pentagram]
-            elif "$" in pentagram or "_" in pentagram:
-                penta_prob = very_low_probability
+        log_score = 0.0
+        for j in range(len(window) - 4):
+            pentagram = window[j : j + 5]
+            penta_prob = probabilities.get(pentagram)
+            if "+-+" in pentagram:
+                penta_prob = LARGE_PROBABILITY
             else:
-                penta_prob = low_probability
-
-            # Penalize pentagrams that are close to the beginning or end of the word
-            position_score = 1 - abs(i - center_position) / center_position
-            penta_prob *= position_score**2
-            print(pentagram, position_score, penta_prob)
-            score *= penta_prob
-
-        if pentagrams_not_found == 5:
-            score = 0.0
-        print("Score:", score)
-        scores.append(score)
-
-    # Combine candidates with their scores
-    results = list(zip(candidates, scores))
-    # Remove candidates with 0.0 probability
-    results = [x for x in results if x[1] > 0]
+                if penta_prob is None:
+                    pentagrams_not_found += 1
+                if pentagram[0:2] == "-+" or pentagram[-2:] == "+-":
+                    penta_prob = LARGE_PROBABILITY
+                elif penta_prob is None:
+                    if "$" in pentagram or "_" in pentagram:
+                        penta_prob = VERY_LOW_PROBABILITY
+                    else:
+                        penta_prob = LOW_PROBABILITY
+            position_score, log_weight = weights[first + j]
+            log_score += log(penta_prob) + log_weight
+            if trace:
+                pentagram_traces.append(
+                    {
+                        "pentagram": pentagram,
+                        "position_score": position_score,
+                        "probability": penta_prob * position_score**2,
+                    }
+                )
+
+        found = pentagrams_not_found != 5
+        if found:
+            results.append((log_score, i, joint_element))
+        if trace:
+            candidate = compound[:i] + marker + compound[i + len(joint_element) :]
+            candidate_traces.append(
+                {
+                    "candidate": candidate,
+                    "pentagrams": pentagram_traces,
+                    "score": exp(log_score) if found else 0.0,
+                }
+            )
+
     # Sort results in descending order by score
-    results.sort(key=lambda x: x[1], reverse=True)
+    if top_k and max_parts <= 2:
+        results = nlargest(top_k, results, key=itemgetter(0))
+    else:
+        results.sort(key=itemgetter(0), reverse=True)
 
     output = {}
     output["word"] = compound
     output["splits"] = []
-    for candidate, score in results:
-        split = candidate.split("+")
-        joint_element = split[1] if len(split) > 2 else ""
+    for log_score, i, joint_element in results:
         output["splits"].append(
-            {"subtokens": [split[0], split[-1]], "fuge": joint_element, "score": score}
+            {
+                "subtokens": [compound[:i], compound[i + len(joint_element) :]],
+                "fuge": joint_element,
+                "score": exp(log_score),
+            }
+        )
+    if "+" in compound:
+        logger.warning(f"Compound {compound} already contains a split!")
+    if max_parts > 2:
+        min_log_score = log(min_part_score)
+        output["splits"] = decompose(
+            output["splits"],
+            lambda part: split_compound(part, probabilities)["splits"],
+            max_parts,
+            gain=lambda score: score > 0 and log(score) - min_log_score,
+            top_k=top_k,
         )
-        if len(split) > 3:
-            logger.warning(f"More than 3 splits for {compound}: {split}!")
+    if trace:
+        output["trace"] = candidate_traces
 
     return output
 
@@ -0,0 +1,74 @@
+"""Bounded least-recently-used cache for split results."""
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Hashable
+
+
+class LRUCache:
+    """Thread-safe mapping that evicts the least recently used entry when full.
+
+    Args:
+        maxsize: Maximum number of entries. 0 disables the cache.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        # Incremented by clear, so values computed before it can be refused
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the value for key and mark it as recently used."""
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, generation: int | None = None) -> None:
+        """Store value for key, evicting the least recently used entry if full.
+
+        Args:
+            key: Key of the value.
+            value: Value to store.
+            generation: If given, the value is only stored if the cache has not
+                been cleared since generation was read.
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Remove all entries. The counters are kept."""
+        with self._lock:
+            self._data.clear()
+            self.generation += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Return size and hit, miss and eviction counters."""
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def __len__(self) -> int:
+        return len(self._data)
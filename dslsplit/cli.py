@@ -0,0 +1,315 @@
+"""Command-line interface for DSLSplit."""
+import argparse
+import json
+import sys
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List
+
+from dslsplit import CONFIG
+from dslsplit.benchmark import (
+    BENCHMARKS,
+    compare,
+    format_results,
+    read_run,
+    run_benchmarks,
+    write_run,
+)
+from dslsplit.brute_split import chunked, train_variant, variants
+from dslsplit.executor import map_ordered
+from dslsplit.model import build_model, update_model
+from dslsplit.ngram_table import write_table
+from dslsplit.pipeline import (
+    LANGUAGES,
+    MAX_PARTS,
+    METHODS,
+    VARIANTS,
+    check_parameters,
+    split_many,
+)
+
+FORMATS = ("ndjson", "tsv")
+TSV_HEADER = "word\tmethod\tsubtokens\tfuges\tscore\n"
+
+
+def argparser() -> argparse.ArgumentParser:
+    """Handle command-line arguments."""
+    parser = argparse.ArgumentParser(
+        prog="dslsplit", description="Compound splitter for Danish"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser(
+        "build-model", help="Train the models and write the model artifact"
+    )
+    build.add_argument(
+        "--directory", "-d", help="Directory for the model artifacts", default=None
+    )
+    build.add_argument(
+        "--force", action="store_true", help="Rebuild even if the model is up to date"
+    )
+    build.set_defaults(func=run_build_model)
+
+    train_brute = subparsers.add_parser(
+        "train-brute", help="Train the brute models and write them as ngram tables"
+    )
+    train_brute.add_argument(
+        "--variant",
+        "-v",
+        action="append",
+        choices=variants(),
+        help="Language variant to train (default: all variants in the config)",
+    )
+    train_brute.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=None,
+        help="Number of training processes, 0 for one per CPU (default: from config)",
+    )
+    train_brute.add_argument(
+        "--output-dir", "-o", help="Directory for the ngram tables", default="."
+    )
+    train_brute.set_defaults(func=run_train_brute)
+
+    update = subparsers.add_parser(
+        "update-model",
+        help="Add new compounds to the model artifact without retraining",
+    )
+    update.add_argument(
+        "files",
+        nargs="*",
+        help='Files with a compound on each line with "+" between the parts, '
+        "e.g. kaffe+kop+holder (default: standard input)",
+    )
+    update.add_argument(
+        "--directory", "-d", help="Directory for the model artifacts", default=None
+    )
+    update.add_argument(
+        "--variant",
+        "-v",
+        action="append",
+        choices=variants(),
+        help="Brute variant to add the compounds to (default: all variants)",
+    )
+    update.set_defaults(func=run_update_model)
+
+    split = subparsers.add_parser(
+        "split",
+        help="Split the words in files or standard input",
+        description="Split the words in files or standard input. By default each "
+        "line is tokenised on whitespace. The results are written in input order.",
+    )
+    split.add_argument(
+        "files", nargs="*", help="Files to split (default: standard input)"
+    )
+    split.add_argument(
+        "--lines", action="store_true", help="Split each line as one word"
+    )
+    split.add_argument("--method", "-m", choices=METHODS, default="mixed")
+    split.add_argument("--variant", "-v", choices=VARIANTS, default="nudansk")
+    split.add_argument("--lang", "-l", choices=LANGUAGES, default="da")
+    split.add_argument(
+        "--max-parts",
+        type=int,
+        default=2,
+        help=f"Maximum number of parts, 2 to {MAX_PARTS} (default: 2)",
+    )
+    split.add_argument(
+        "--top-k",
+        type=int,
+        default=None,
+        help="Only return the top k splits of each word (default: all)",
+    )
+    split.add_argument(
+        "--format",
+        "-f",
+        choices=FORMATS,
+        default="ndjson",
+        help="ndjson: the result of each word as returned by the webservice. "
+        "tsv: the best split of each word (default: ndjson)",
+    )
+    split.add_argument(
+        "--output", "-o", help="Output file (default: standard output)", default=None
+    )
+    split.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=0,
+        help="Number of worker processes, 1 to split in this process "
+        "(default: one per CPU)",
+    )
+    split.add_argument(
+        "--chunk-size",
+        type=int,
+        default=CONFIG.getint("executor", "chunk_size", fallback=500),
+        help="Number of words per task (default: chunk_size in [executor])",
+    )
+    split.set_defaults(func=run_split)
+
+    bench = subparsers.add_parser(
+        "bench",
+        help="Run micro-benchmarks and compare them with an earlier run",
+        description="Time the splitting functions on words of different lengths, "
+        "model loading and training. Exits with status 1 if a benchmark is slower "
+        "than in the baseline by more than the threshold.",
+    )
+    bench.add_argument(
+        "--benchmark",
+        "-b",
+        action="append",
+        choices=BENCHMARKS,
+        help="Benchmark to run (default: all)",
+    )
+    bench.add_argument(
+        "--output", "-o", help="File to write the results to as JSON", default=None
+    )
+    bench.add_argument(
+        "--baseline", help="Results of an earlier run to compare with", default=None
+    )
+    bench.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Relative slowdown that counts as a regression (default: 0.1)",
+    )
+    bench.add_argument(
+        "--words",
+        type=int,
+        default=50,
+        help="Number of words in each length bucket (default: 50)",
+    )
+    bench.add_argument(
+        "--repeat", type=int, default=5, help="Number of timed runs (default: 5)"
+    )
+    bench.add_argument(
+        "--seed", type=int, default=0, help="Seed of the word sample (default: 0)"
+    )
+    bench.set_defaults(func=run_bench)
+    return parser
+
+
+def run_build_model(args: argparse.Namespace) -> None:
+    path = build_model(args.directory, force=args.force)
+    print(path)
+
+
+def run_train_brute(args: argparse.Namespace) -> None:
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for variant in args.variant or variants():
+        path = output_dir / f"brute_{variant}.ngt"
+        write_table(path, train_variant(variant, workers=args.workers))
+        print(path)
+
+
+def read_lines(files: List[str]) -> Iterator[str]:
+    """Yield the lines of files, or of standard input if there are no files."""
+    if not files:
+        yield from sys.stdin
+    for filename in files:
+        with open(filename, encoding="utf8") as f:
+            yield from f
+
+
+def run_update_model(args: argparse.Namespace) -> None:
+    path = update_model(read_lines(args.files), args.directory, args.variant)
+    print(path)
+
+
+def read_words(lines: Iterable[str], whole_lines: bool = False) -> Iterator[str]:
+    """Yield the whitespace separated tokens, or the stripped lines, of lines."""
+    for line in lines:
+        if whole_lines:
+            if line.strip():
+                yield line.strip()
+        else:
+            yield from line.split()
+
+
+def format_result(message: Dict[str, Any], output_format: str) -> str:
+    """Format the result of a word as a line of NDJSON or TSV."""
+    if output_format == "ndjson":
+        return json.dumps(message, ensure_ascii=False) + "\n"
+    subtokens = fuges = score = ""
+    if message["splits"]:
+        best = message["splits"][0]
+        subtokens = "+".join(best["subtokens"])
+        fuges = "+".join(best.get("fuges", [best["fuge"]]))
+        score = str(best["score"])
+    return (
+        "\t".join((message["word"], message["method"], subtokens, fuges, score)) + "\n"
+    )
+
+
+def split_chunk(
+    words: List[str],
+    output_format: str,
+    method: str,
+    variant: str,
+    lang: str,
+    max_parts: int,
+    top_k: int | None = None,
+) -> str:
+    """Split a chunk of words and return the formatted results."""
+    messages = split_many(words, method, variant, lang, max_parts, top_k)
+    return "".join(format_result(message, output_format) for message in messages)
+
+
+def run_split(args: argparse.Namespace) -> None:
+    try:
+        check_parameters(
+            args.method, args.variant, args.lang, args.max_parts, args.top_k
+        )
+    except ValueError as error:
+        raise SystemExit(f"dslsplit split: error: {error}")
+    func = partial(
+        split_chunk,
+        output_format=args.format,
+        method=args.method,
+        variant=args.variant,
+        lang=args.lang,
+        max_parts=args.max_parts,
+        top_k=args.top_k,
+    )
+    words = read_words(read_lines(args.files), args.lines)
+    output = open(args.output, "w", encoding="utf8") if args.output else sys.stdout
+    try:
+        if args.format == "tsv":
+            output.write(TSV_HEADER)
+        for text in map_ordered(func, chunked(words, args.chunk_size), args.workers):
+            output.write(text)
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+def run_bench(args: argparse.Namespace) -> None:
+    run = run_benchmarks(
+        args.benchmark or BENCHMARKS, args.words, args.repeat, args.seed
+    )
+    print(format_results(run))
+    if args.output:
+        write_run(run, args.output)
+    if args.baseline:
+        regressions = compare(run, read_run(args.baseline), args.threshold)
+        for regression in regressions:
+            print(
+                f"Regression: {regression['name']} {regression['bucket'] or ''} "
+                f"{regression['baseline']:.4g} -> {regression['median']:.4g} "
+                f"({regression['change']:+.0%})",
+                file=sys.stderr,
+            )
+        if regressions:
+            raise SystemExit(1)
+
+
+def main(argv: List[str] | None = None) -> None:
+    args = argparser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
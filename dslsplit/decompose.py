@@ -0,0 +1,98 @@
+"""Decomposition of compounds into more than two parts."""
+from typing import Any, Callable, Dict, List, Tuple
+
+Split = Dict[str, Any]
+Decomposition = Tuple[float, List[str], List[str]]
+
+
+def decompose(
+    splits: List[Split],
+    split_part: Callable[[str], List[Split]],
+    max_parts: int,
+    gain: Callable[[float], float],
+    top_k: int | None = None,
+) -> List[Split]:
+    """Extend two-part splits to the best decompositions into at most max_parts parts.
+
+    The parts of each split are split further by dynamic programming over their
+    own two-part splits. A split of a part is only used when its gain is
+    positive, and the decomposition with the highest total gain is chosen.
+    Each part is split and each (part, number of parts) subproblem is solved
+    only once, so subproblems shared between the splits are reused.
+
+    Different splits can be decomposed into the same parts. Only the first of
+    them, which has the best score, is kept, so each decomposition is returned
+    once and the top_k splits are all different.
+
+    Args:
+        splits: Two-part splits of the word, best first, as dictionaries with the
+            keys subtokens, fuge and score.
+        split_part: Function returning the two-part splits of a part.
+        max_parts: Maximum number of parts in a decomposition.
+        gain: Function mapping the score of a split of a part to its gain.
+        top_k: If given, stop after the first top_k different decompositions.
+
+    Returns:
+        The splits in the same order without repeated decompositions, with
+        subtokens holding all parts, fuges the joint element between each pair
+        of parts and score and fuge unchanged.
+    """
+    part_splits: Dict[str, List[Split]] = {}
+    best: Dict[Tuple[str, int], Decomposition] = {}
+
+    def combine(split: Split, max_parts: int, split_gain: float) -> Decomposition:
+        """Return the best decomposition of the parts of split."""
+        head, tail = split["subtokens"]
+        result = None
+        for head_parts in range(1, max_parts):
+            head_gain, heads, head_fuges = best_decomposition(head, head_parts)
+            tail_gain, tails, tail_fuges = best_decomposition(
+                tail, max_parts - head_parts
+            )
+            total = split_gain + head_gain + tail_gain
+            if result is None or total > result[0]:
+                fuges = head_fuges + [split["fuge"]] + tail_fuges
+                result = (total, heads + tails, fuges)
+        return result
+
+    def best_decomposition(part: str, max_parts: int) -> Decomposition:
+        """Return the decomposition of part with the highest total gain."""
+        if max_parts < 2:
+            return 0.0, [part], []
+        key = (part, max_parts)
+        if key not in best:
+            if part not in part_splits:
+                part_splits[part] = split_part(part)
+            result = (0.0, [part], [])
+            for split in part_splits[part]:
+                if len(split["subtokens"]) != 2:
+                    continue
+                split_gain = gain(split["score"])
+                if split_gain <= 0:
+                    continue
+                decomposition = combine(split, max_parts, split_gain)
+                if decomposition[0] > result[0]:
+                    result = decomposition
+            best[key] = result
+        return best[key]
+
+    output = []
+    seen = set()
+    for split in splits:
+        if top_k and len(output) >= top_k:
+            break
+        if len(split["subtokens"]) != 2:
+            decomposed = split
+        else:
+            _, parts, fuges = combine(split, max_parts, 0.0)
+            decomposed = {
+                "subtokens": parts,
+                "fuge": split["fuge"],
+                "fuges": fuges,
+                "score": split["score"],
+            }
+        key = tuple(decomposed["subtokens"])
+        if key not in seen:
+            seen.add(key)
+            output.append(decomposed)
+    return output
@@ -1,41 +1,165 @@
-"""Evaluation of the DSLSplit webservice."""
+"""Evaluation of the DSLSplit splitting methods.
+
+The words in the evaluation data are split once, either directly with the
+library or concurrently by a running webservice. Precision and recall are then
+computed for each combination of ignoring the joint element and counting a
+split as found in the top 1 or top 3, and reported with the latency and
+throughput of the pass:
+
+    python -m dslsplit.evaluation --method careful --size 152
+    python -m dslsplit.evaluation --url http://localhost:9001 --concurrency 32
+"""
+import argparse
+import asyncio
 import csv
-import requests
+import math
+import time
+from itertools import product
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Tuple
 
+from dslsplit.pipeline import (
+    METHODS,
+    compute_split,
+    make_message,
+    result_key,
+    warm_up,
+)
 
-def main(
-    method: str = "brute",
-    port: int = 9001,
-    size: int | None = None,
-    ignore_fuge: bool = True,
-    in_top: int = 1,
-    print_negatives: bool = False,
-) -> None:
-    # Load CSS file with evaluation data
-    with open("evaluation_data.csv") as f:
-        reader = csv.reader(f, delimiter=";")
-        data = list(reader)[0:]  # No header row
-
-    # Send requests to FastAPI webservice and compare with expected output
-    tp = 0  # True positives
-    fp = 0  # False positives
-    fn = 0  # False negatives
-    tn = 0  # True negatives
+current_dir = Path(__file__).parent.resolve()
+EVALUATION_FILE = current_dir / "evaluation_data.csv"
+IGNORE_FUGE = (False, True)
+IN_TOP = (1, 3)
+
+
+class Prediction(NamedTuple):
+    """Splits of an evaluation word and the time it took to get them."""
+
+    query: str
+    expected: str
+    splits: List[Dict[str, Any]]
+    method: str
+    latency: float
+
+
+class Run(NamedTuple):
+    """Predictions of one pass over the evaluation data."""
+
+    predictions: List[Prediction]
+    elapsed: float
+
+
+def read_evaluation_data(
+    path: str | Path = EVALUATION_FILE, size: int | None = None
+) -> List[Tuple[str, str]]:
+    """Return the words and their expected splits, "+" between the parts.
+
+    Args:
+        path: Semicolon separated file without header row.
+        size: Maximum number of words to return (default: all).
+    """
+    with open(path, encoding="utf8") as f:
+        data = [(row[0], row[1]) for row in csv.reader(f, delimiter=";") if row]
+    return data[:size] if size else data
+
+
+def evaluate_local(data: Iterable[Tuple[str, str]], method: str = "mixed") -> Run:
+    """Split the evaluation words in this process, without the result cache.
+
+    The models are loaded before the pass, so it is not included in the timing.
+    """
+    warm_up()
+    predictions = []
+    start = time.perf_counter()
+    for query, expected in data:
+        word_start = time.perf_counter()
+        message = make_message(
+            query, compute_split(result_key(query, method, "nudansk", "da"))
+        )
+        latency = time.perf_counter() - word_start
+        predictions.append(
+            Prediction(query, expected, message["splits"], message["method"], latency)
+        )
+    return Run(predictions, time.perf_counter() - start)
+
+
+async def evaluate_service_async(
+    data: Iterable[Tuple[str, str]],
+    method: str = "mixed",
+    url: str = "http://localhost:9001",
+    concurrency: int = 16,
+    api_key: str | None = None,
+) -> Run:
+    """Split the evaluation words with concurrent requests to the webservice.
+
+    One client session is used for all requests, and at most concurrency
+    requests are in flight at a time. The latency of a word is timed from when
+    its request gets a slot, so it does not include waiting for other words.
+    Words the service fails to split get no splits.
+    """
+    import aiohttp
+
+    headers = {"api-key": api_key} if api_key else {}
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    slots = asyncio.Semaphore(concurrency)
+
+    async def predict(
+        session: aiohttp.ClientSession, query: str, expected: str
+    ) -> Prediction:
+        async with slots:
+            start = time.perf_counter()
+            async with session.get(
+                f"{url}/split/{query}", params={"method": method}
+            ) as response:
+                result = await response.json() if response.status == 200 else {}
+            latency = time.perf_counter() - start
+        return Prediction(
+            query,
+            expected,
+            result.get("splits", []),
+            result.get("method", ""),
+            latency,
+        )
+
+    async with aiohttp.ClientSession(connector=connector, headers=headers) as session:
+        start = time.perf_counter()
+        predictions = await asyncio.gather(
+            *(predict(session, query, expected) for query, expected in data)
+        )
+        return Run(list(predictions), time.perf_counter() - start)
+
+
+def evaluate_service(data: Iterable[Tuple[str, str]], *args, **kwargs) -> Run:
+    """Run evaluate_service_async in a new event loop."""
+    return asyncio.run(evaluate_service_async(data, *args, **kwargs))
+
+
+def remove_fuge(split: str) -> str:
+    """Join "s" and "e" joint elements to the part before them."""
+    return split.replace("+s+", "s+").replace("+e+", "e+")
+
+
+def score(
+    predictions: Iterable[Prediction], ignore_fuge: bool = True, in_top: int = 1
+) -> Dict[str, Any]:
+    """Count the correct and wrong splits of predictions.
+
+    Args:
+        predictions: Predictions of a pass over the evaluation data.
+        ignore_fuge: If True, a joint element "s" or "e" need not be split off.
+        in_top: Number of splits of each word the expected split may be among.
+
+    Returns:
+        Dictionary with the number of true and false positives and negatives,
+        the precision and recall, and the false positives and negatives as
+        tuples of query, expected split, actual splits and method.
+    """
+    tp = fp = fn = tn = 0
     false_positives = []
     false_negatives = []
-    for i, (query, expected_output) in enumerate(data):
-        params = {"method": method}
-        response = requests.get(f"http://localhost:{port}/split/{query}", params=params)
-        if response.status_code == 200:
-            result = response.json()
-            actual_output = result.get("splits", [])
-            actual_method = result.get("method", "")
-        else:
-            actual_output = []
-            actual_method = ""
-
+    for query, expected, splits, method, _ in predictions:
         actual_splits = []
-        for split in actual_output[:in_top]:
+        for split in splits[:in_top]:
             if len(split.get("subtokens", [])) > 1:
                 actual_splits.append(
                     split["subtokens"][0]
@@ -45,80 +169,185 @@ def main(
                 )
 
         if ignore_fuge:
-            new_output = []
-            for actual_split in actual_splits:
-                actual_split = actual_split.replace("+s+", "s+")
-                actual_split = actual_split.replace("+e+", "e+")
-                new_output.append(actual_split)
-            actual_splits = new_output
-            expected_output = expected_output.replace("+s+", "s+")
-            expected_output = expected_output.replace("+e+", "e+")
+            actual_splits = [remove_fuge(split) for split in actual_splits]
+            expected = remove_fuge(expected)
 
         if actual_splits:
-            if expected_output in actual_splits:
+            if expected in actual_splits:
                 tp += 1
             else:
                 fp += 1
-                false_positives.append(
-                    (query, expected_output, actual_splits, actual_method)
-                )
+                false_positives.append((query, expected, actual_splits, method))
         else:
-            if expected_output in actual_splits:
-                tn += 1
-            else:
-                fn += 1
-                false_negatives.append(
-                    (query, expected_output, actual_splits, actual_method)
-                )
+            fn += 1
+            false_negatives.append((query, expected, actual_splits, method))
+
+    return {
+        "true_positives": tp,
+        "true_negatives": tn,
+        "false_positives": fp,
+        "false_negatives": fn,
+        "precision": tp / (tp + fp) if tp + fp else 0.0,
+        "recall": tp / (tp + fn) if tp + fn else 0.0,
+        "false_positive_words": false_positives,
+        "false_negative_words": false_negatives,
+    }
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """Return the nearest-rank percentile of values."""
+    values = sorted(values)
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(percent / 100 * len(values)))
+    return values[rank - 1]
+
+
+def latency_stats(run: Run) -> Dict[str, float]:
+    """Return the p50, p95 and p99 latency in milliseconds and the throughput."""
+    latencies = [prediction.latency * 1000 for prediction in run.predictions]
+    return {
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "words_per_second": len(latencies) / run.elapsed if run.elapsed else 0.0,
+    }
+
 
-        if size and i > size:
-            break
+def report(
+    run: Run,
+    ignore_fuge: Iterable[bool] = IGNORE_FUGE,
+    in_top: Iterable[int] = IN_TOP,
+) -> Dict[Tuple[bool, int], Dict[str, Any]]:
+    """Score a run for each combination of ignore_fuge and in_top."""
+    return {
+        (ignore, top): score(run.predictions, ignore, top)
+        for ignore, top in product(ignore_fuge, in_top)
+    }
 
-    # Calculate precision and recall
-    precision = tp / (tp + fp)
-    recall = tp / (tp + fn)
+
+def main(
+    method: str = "brute",
+    port: int = 9001,
+    size: int | None = None,
+    ignore_fuge: Iterable[bool] = IGNORE_FUGE,
+    in_top: Iterable[int] = IN_TOP,
+    print_negatives: bool = False,
+    url: str | None = None,
+    local: bool = False,
+    concurrency: int = 16,
+    api_key: str | None = None,
+) -> None:
+    """Evaluate a method in one pass and print the scores of each combination.
+
+    Args:
+        method: "mixed", "careful" or "brute".
+        port: Port of the webservice on localhost, if url is not given.
+        size: Number of evaluation words (default: all).
+        ignore_fuge: Values of ignore_fuge to score.
+        in_top: Values of in_top to score.
+        print_negatives: If True, print the false positives and negatives.
+        url: Base URL of the webservice.
+        local: If True, split the words in this process instead of by the
+            webservice.
+        concurrency: Number of concurrent requests to the webservice.
+        api_key: API key for the webservice, if security is enabled.
+    """
+    data = read_evaluation_data(size=size)
+    if local:
+        run = evaluate_local(data, method)
+    else:
+        url = url or f"http://localhost:{port}"
+        run = evaluate_service(data, method, url, concurrency, api_key)
+    stats = latency_stats(run)
 
     print("===============")
     print(f"Method: {method}")
-    print(f"Size: {size}")
-    print(f"Top {in_top}")
-    print(f"Ignore Fuge: {ignore_fuge}")
-    print("---------------")
-
-    if print_negatives:
-        # Print results
-        print("False positives:")
-        for query, expected_output, actual_output, actual_method in false_positives:
-            #    if not expected_output:
-            #        continue
-            print(
-                f"Query: {query}, Expected output: {expected_output}, Actual output: {actual_output} (method: {actual_method}))"
-            )
-        print("False negatives:")
-        for query, expected_output, actual_output, actual_method in false_negatives:
-            print(
-                f"Query: {query}, Expected output: {expected_output}, Actual output: {actual_output} (method: {actual_method})))"
+    print(f"Size: {len(data)}")
+    print(f"Backend: {'local' if local else url}")
+    print(
+        f"Latency p50/p95/p99: {stats['p50_ms']:.2f}/{stats['p95_ms']:.2f}/"
+        f"{stats['p99_ms']:.2f} ms"
+    )
+    print(f"Throughput: {stats['words_per_second']:.1f} words/s")
+
+    for (ignore, top), scores in report(run, ignore_fuge, in_top).items():
+        print("---------------")
+        print(f"Top {top}")
+        print(f"Ignore Fuge: {ignore}")
+
+        if print_negatives:
+            print("False positives:")
+            for query, expected, actual, actual_method in scores[
+                "false_positive_words"
+            ]:
+                print(
+                    f"Query: {query}, Expected output: {expected}, Actual output: {actual} (method: {actual_method})"
+                )
+            print("False negatives:")
+            for query, expected, actual, actual_method in scores[
+                "false_negative_words"
+            ]:
+                print(
+                    f"Query: {query}, Expected output: {expected}, Actual output: {actual} (method: {actual_method})"
+                )
+
+        total = sum(
+            scores[key]
+            for key in (
+                "true_positives",
+                "true_negatives",
+                "false_positives",
+                "false_negatives",
             )
+        )
+        print(f"True positives: {scores['true_positives']}")
+        print(f"True negatives: {scores['true_negatives']}")
+        print(f"Total: {total}")
+        print(f"Precision: {scores['precision']:.2f}")
+        print(f"Recall: {scores['recall']:.2f}")
+
 
-    print(f"True positives: {tp}")
-    print(f"True negatives: {tn}")
-    print(f"Total: {tp + tn + fp + fn}")
-    print(f"Precision: {precision:.2f}")
-    print(f"Recall: {recall:.2f}")
+def argparser() -> argparse.Namespace:
+    """Handle command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Evaluate the splitting methods on the evaluation data"
+    )
+    parser.add_argument(
+        "--method",
+        "-m",
+        action="append",
+        choices=METHODS,
+        help="Method to evaluate (default: careful, brute and mixed)",
+    )
+    parser.add_argument("--size", type=int, default=152, help="Number of words")
+    parser.add_argument(
+        "--local", action="store_true", help="Split in this process, not by a service"
+    )
+    parser.add_argument("--port", type=int, default=9001, help="Port on localhost")
+    parser.add_argument("--url", default=None, help="Base URL of the webservice")
+    parser.add_argument(
+        "--concurrency", type=int, default=16, help="Number of concurrent requests"
+    )
+    parser.add_argument("--api-key", default=None, help="API key of the webservice")
+    parser.add_argument(
+        "--print-negatives",
+        action="store_true",
+        help="Print the false positives and negatives",
+    )
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    main(method="careful", size=150, ignore_fuge=False, in_top=1)
-    main(method="careful", size=150, ignore_fuge=True, in_top=1)
-    main(method="careful", size=150, ignore_fuge=False, in_top=3)
-    main(method="careful", size=150, ignore_fuge=True, in_top=3)
-
-    main(method="brute", size=150, ignore_fuge=False, in_top=1)
-    main(method="brute", size=150, ignore_fuge=True, in_top=1)
-    main(method="brute", size=150, ignore_fuge=False, in_top=3)
-    main(method="brute", size=150, ignore_fuge=True, in_top=3)
-
-    main(method="mixed", size=150, ignore_fuge=False, in_top=1)
-    main(method="mixed", size=150, ignore_fuge=True, in_top=1)
-    main(method="mixed", size=150, ignore_fuge=False, in_top=3)
-    main(method="mixed", size=150, ignore_fuge=True, in_top=3)
+    ARGS = argparser()
+    for evaluated_method in ARGS.method or ("careful", "brute", "mixed"):
+        main(
+            method=evaluated_method,
+            port=ARGS.port,
+            size=ARGS.size,
+            print_negatives=ARGS.print_negatives,
+            url=ARGS.url,
+            local=ARGS.local,
+            concurrency=ARGS.concurrency,
+            api_key=ARGS.api_key,
+        )
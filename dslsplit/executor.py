@@ -0,0 +1,191 @@
+"""Execution backends for running CPU-bound splitting outside the event loop."""
+import asyncio
+import os
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Iterable, Iterator, List, Sequence
+
+from dslsplit import CONFIG, logger
+from dslsplit.metrics import REGISTRY, collect
+
+BACKENDS = ("thread", "process")
+
+
+class QueueFullError(RuntimeError):
+    """Raised when too many tasks are waiting for the execution backend."""
+
+
+def prepare_model() -> None:
+    """Build the model artifact in this process if it is missing or stale.
+
+    Called before worker processes are started, so they only open the artifact
+    instead of each building it.
+    """
+    from dslsplit.model import load_model
+
+    load_model()
+
+
+def _init_worker() -> None:
+    """Load the warm-up models once when a worker process starts."""
+    from dslsplit.pipeline import warm_up
+
+    warm_up()
+
+
+class SplitExecutor:
+    """Run splitting tasks in a thread or process pool with a bounded queue.
+
+    Args:
+        backend: "thread" or "process".
+        workers: Number of workers in the pool. Defaults to the number of CPUs.
+        queue_size: Maximum number of tasks submitted and not yet finished.
+    """
+
+    def __init__(
+        self, backend: str = "thread", workers: int = 0, queue_size: int = 1000
+    ):
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend {backend} not supported")
+        self.backend = backend
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.pending = 0
+        self._executor: Executor | None = None
+
+    @property
+    def executor(self) -> Executor:
+        """The underlying pool, created on first use."""
+        if self._executor is None:
+            self.start()
+        return self._executor
+
+    def start(self) -> None:
+        """Create the pool if it is not running.
+
+        With the process backend, the model artifact is built first if it is
+        missing or stale, which can take long. The webservice calls this before
+        it serves requests, so that does not happen on the event loop.
+        """
+        if self._executor is None:
+            logger.info(f"Starting {self.backend} pool with {self.workers} workers")
+            if self.backend == "process":
+                prepare_model()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, initializer=_init_worker
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers)
+
+    async def run(self, func: Callable, *args: Any, **kwargs: Any) -> Any:
+        """Run func(*args, **kwargs) in the pool and return the result.
+
+        With the process backend, the metrics recorded by the task in the worker
+        process are merged into the metrics of this process.
+
+        Raises:
+            QueueFullError: If queue_size tasks are already pending.
+        """
+        # Only called from the event loop thread, so no lock is needed
+        if self.pending >= self.queue_size:
+            raise QueueFullError(f"More than {self.queue_size} pending tasks")
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            if self.backend == "thread":
+                return await loop.run_in_executor(
+                    self.executor, partial(func, *args, **kwargs)
+                )
+            result, metrics = await loop.run_in_executor(
+                self.executor, partial(collect, func, *args, **kwargs)
+            )
+            REGISTRY.merge(metrics)
+            return result
+        finally:
+            self.pending -= 1
+
+    async def run_chunked(
+        self, func: Callable, items: Sequence, chunk_size: int, **kwargs: Any
+    ) -> List:
+        """Run func on chunks of items in parallel and concatenate the results.
+
+        Args:
+            func: Function taking a list of items and returning a list of results.
+            items: Items to process.
+            chunk_size: Maximum number of items per task.
+            kwargs: Extra keyword arguments for func.
+
+        Returns:
+            List of results in the same order as items.
+        """
+        chunks = [items[i : i + chunk_size] for i in range(0, len(items), chunk_size)]
+        results = await asyncio.gather(
+            *(self.run(func, chunk, **kwargs) for chunk in chunks)
+        )
+        return [result for chunk_results in results for result in chunk_results]
+
+    def restart(self) -> None:
+        """Replace the worker processes of the process backend with new ones.
+
+        The new workers load the current models when they start, and are
+        started before they replace the old ones. Tasks already submitted finish
+        in the old workers, which then exit. The thread backend shares the
+        models of this process, so nothing is done for it.
+        """
+        if self.backend != "process" or self._executor is None:
+            return
+        logger.info(f"Restarting process pool with {self.workers} workers")
+        prepare_model()
+        pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        for future in [pool.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+        old, self._executor = self._executor, pool
+        old.shutdown(wait=False)
+
+    def shutdown(self) -> None:
+        """Stop the pool, waiting for running tasks to finish."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+def executor_from_config() -> SplitExecutor:
+    """Create an executor as specified in the [executor] section of the config."""
+    return SplitExecutor(
+        backend=CONFIG.get("executor", "backend", fallback="thread"),
+        workers=CONFIG.getint("executor", "workers", fallback=0),
+        queue_size=CONFIG.getint("executor", "queue_size", fallback=1000),
+    )
+
+
+def map_ordered(
+    func: Callable, chunks: Iterable, workers: int = 0, window: int = 0
+) -> Iterator:
+    """Apply func to each chunk in worker processes and yield the results in order.
+
+    At most window chunks are submitted and not yet yielded, so the chunks are
+    read lazily and memory stays bounded however many chunks there are.
+
+    Args:
+        func: Picklable function taking a chunk.
+        chunks: Chunks to process.
+        workers: Number of worker processes. 0 uses one per CPU and 1 applies
+            func in this process.
+        window: Maximum number of chunks in flight. Defaults to twice the
+            number of workers.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        yield from map(func, chunks)
+        return
+    window = window or 2 * workers
+    prepare_model()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        pending: deque = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(func, chunk))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
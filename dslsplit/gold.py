@@ -0,0 +1,114 @@
+"""Exact-match index of the gold splits in the compound lists.
+
+The compounds the brute models are trained on mark the split positions with
+"+", e.g. "abonnement+s+afgift" or "A+-+bombe". The index maps each compound,
+lowercased and without "+", to a bit mask of the positions of its "+". It is
+stored as a table in the model artifact (see ngram_table), so a known compound
+is split with one lookup instead of being scored. A mask of 0 marks a word the
+lists hold without a split.
+"""
+from typing import Any, Container, Dict, Iterable, List, Mapping, Tuple
+
+from dslsplit.brute_split import JOINT_ELEMENTS
+
+# The masks are stored as uint32, so longer compounds are left out of the index
+MAX_GOLD_LENGTH = 33
+
+Split = Dict[str, Any]
+
+
+def split_mask(compound: str) -> Tuple[str, int]:
+    """Return a compound without "+", lowercased, and the mask of its split positions.
+
+    Bit i - 1 of the mask is set when there is a "+" before character i.
+    """
+    word = ""
+    mask = 0
+    for part in compound.split("+"):
+        if word and part:
+            mask |= 1 << (len(word) - 1)
+        word += part
+    return word.lower(), mask
+
+
+def gold_index(compounds: Iterable[str]) -> Dict[str, int]:
+    """Return the split masks of compounds.
+
+    A word that occurs with different splits gets the first one, so the data
+    files listed first in the config take precedence.
+    """
+    index = {}
+    for compound in compounds:
+        word, mask = split_mask(compound)
+        if word and len(word) <= MAX_GOLD_LENGTH and word not in index:
+            index[word] = mask
+    return index
+
+
+def gold_parts(word: str, mask: int) -> List[str]:
+    """Cut word at the positions in mask."""
+    parts = []
+    start = 0
+    for i in range(1, len(word)):
+        if mask >> (i - 1) & 1:
+            parts.append(word[start:i])
+            start = i
+    parts.append(word[start:])
+    return parts
+
+
+def gold_split(
+    word: str,
+    index: Mapping[str, int],
+    max_parts: int = 2,
+    lemmas: Container[str] = (),
+) -> List[Split] | None:
+    """Return the gold split of word, if it is in the index.
+
+    The parts keep the case of word. A part "s", "e" or "-" between two other
+    parts is the joint element between them. The compound lists often keep the
+    joint element on the first part, e.g. "skrivebords+lampe". Like with the
+    careful method, a trailing "s" or "e" of a part that is not a known lemma is
+    the joint element if the rest of the part is a lemma.
+
+    Args:
+        word: Word to split.
+        index: Index as returned by gold_index, or a table of it.
+        max_parts: Maximum number of parts. With more than two, the split has
+            fuges with the joint element between each pair of parts, and fuge
+            holds the first of them.
+        lemmas: Lowercase lemmas for finding joint elements left on a part.
+
+    Returns:
+        A list with the gold split, an empty list if the word is known not to
+        be a compound, or None if the word is not in the index or its gold split
+        has more than max_parts parts.
+    """
+    mask = index.get(word.lower())
+    if mask is None:
+        return None
+    if not mask:
+        return []
+    subtokens = []
+    fuges = []
+    fuge = ""
+    pieces = gold_parts(word, mask)
+    for i, piece in enumerate(pieces):
+        if 0 < i < len(pieces) - 1 and piece in JOINT_ELEMENTS and not fuge:
+            fuge = piece
+            continue
+        if subtokens:
+            fuges.append(fuge)
+        subtokens.append(piece)
+        fuge = ""
+    for i, fuge in enumerate(fuges):
+        part = subtokens[i].lower()
+        if not fuge and part[-1] in "se" and part not in lemmas and part[:-1] in lemmas:
+            fuges[i] = subtokens[i][-1]
+            subtokens[i] = subtokens[i][:-1]
+    if len(subtokens) > max_parts:
+        return None
+    split = {"subtokens": subtokens, "fuge": fuges[0], "score": 1.0}
+    if max_parts > 2:
+        split["fuges"] = fuges
+    return [split]
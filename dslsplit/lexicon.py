@@ -0,0 +1,33 @@
+"""Lemma lexicon used for verifying the parts of a split compound."""
+from typing import Iterable, Iterator
+
+
+class LemmaLexicon:
+    """Immutable set of lemmas with constant time membership lookups.
+
+    The lexicon accepts any iterable of lemmas (list, set, numpy array, another
+    lexicon, ...). Entries that are not strings or are empty are dropped, so the
+    result of e.g. reading a CSV file can be passed in directly.
+    """
+
+    __slots__ = ("_lemmas",)
+
+    def __init__(self, lemmas: Iterable[str] | None = None):
+        if isinstance(lemmas, LemmaLexicon):
+            self._lemmas = lemmas._lemmas
+        else:
+            self._lemmas = frozenset(
+                lemma for lemma in lemmas or () if isinstance(lemma, str) and lemma
+            )
+
+    def __contains__(self, lemma: object) -> bool:
+        return lemma in self._lemmas
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._lemmas)
+
+    def __len__(self) -> int:
+        return len(self._lemmas)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({len(self)} lemmas)"
@@ -0,0 +1,275 @@
+"""Counters and latency histograms exposed in the Prometheus text format.
+
+The metrics are kept in REGISTRY. Worker processes of the process backend have
+their own registry, which is drained after each task and merged into the
+registry of the webservice process by the executor.
+"""
+from bisect import bisect_left
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Tuple
+
+# Upper bounds in seconds, from the per-word scoring stages to model loading
+DEFAULT_BUCKETS = (
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+Labels = Tuple[str, ...]
+
+
+def escape(value: Any) -> str:
+    """Escape a label value."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: Iterable[str], values: Iterable[Any]) -> str:
+    """Format label names and values as {name="value",...}."""
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Counter with a value for each combination of label values.
+
+    Args:
+        name: Metric name.
+        help: Description of the metric.
+        labelnames: Names of the labels.
+    """
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Labels = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+        self._lock = Lock()
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        """Add amount to the counter of the label values."""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: Labels = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def drain(self) -> Dict[Labels, Any]:
+        """Return the values and reset them."""
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: Dict[Labels, Any]) -> None:
+        """Add values returned by drain."""
+        for labels, amount in values.items():
+            self.inc(labels, amount)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{format_labels(self.labelnames, labels)} {value:g}"
+            for labels, value in values
+        ]
+
+
+class Histogram:
+    """Histogram of observations with a series for each combination of label values.
+
+    Args:
+        name: Metric name.
+        help: Description of the metric.
+        labelnames: Names of the labels.
+        buckets: Increasing upper bounds of the buckets. A +Inf bucket is added.
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Labels = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # [non-cumulative bucket counts with the +Inf bucket last, sum]
+        self._values: Dict[Labels, List] = {}
+        self._lock = Lock()
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        """Add an observation for the label values."""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, labels: Labels = ()) -> int:
+        series = self._values.get(labels)
+        return sum(series[0]) if series else 0
+
+    def drain(self) -> Dict[Labels, Any]:
+        """Return the series and reset them."""
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: Dict[Labels, Any]) -> None:
+        """Add series returned by drain."""
+        with self._lock:
+            for labels, (counts, total) in values.items():
+                series = self._values.get(labels)
+                if series is None:
+                    series = self._values[labels] = [[0] * len(counts), 0.0]
+                for index, count in enumerate(counts):
+                    series[0][index] += count
+                series[1] += total
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(
+                (labels, (list(counts), total))
+                for labels, (counts, total) in self._values.items()
+            )
+        lines = []
+        names = self.labelnames + ("le",)
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(
+                    f"{self.name}_bucket{format_labels(names, labels + (le,))} "
+                    f"{cumulative}"
+                )
+            label_text = format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {total:g}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Named counters and histograms."""
+
+    def __init__(self):
+        self.metrics: Dict[str, Counter | Histogram] = {}
+
+    def register(self, metric: Counter | Histogram) -> Counter | Histogram:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Labels = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Labels = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def drain(self) -> Dict[str, Dict[Labels, Any]]:
+        """Return the values of all metrics that have any and reset them."""
+        values = {name: metric.drain() for name, metric in self.metrics.items()}
+        return {name: value for name, value in values.items() if value}
+
+    def merge(self, values: Dict[str, Dict[Labels, Any]]) -> None:
+        """Add values returned by drain, e.g. in a worker process."""
+        for name, value in values.items():
+            self.metrics[name].merge(value)
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text format."""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def render_cache_stats(stats: Dict[str, int], name: str = "dslsplit_cache") -> str:
+    """Return the statistics of an LRUCache in the Prometheus text format."""
+    lines = []
+    for key, metric_type, help in (
+        ("size", "gauge", "Number of entries in the result cache"),
+        ("maxsize", "gauge", "Maximum number of entries in the result cache"),
+        ("hits", "counter", "Result cache hits"),
+        ("misses", "counter", "Result cache misses"),
+        ("evictions", "counter", "Result cache evictions"),
+    ):
+        metric = f"{name}_{key}" + ("_total" if metric_type == "counter" else "")
+        lines.append(f"# HELP {metric} {help}")
+        lines.append(f"# TYPE {metric} {metric_type}")
+        lines.append(f"{metric} {stats[key]}")
+    return "\n".join(lines) + "\n"
+
+
+def collect(func, *args, **kwargs) -> Tuple[Any, Dict[str, Dict[Labels, Any]]]:
+    """Call func and return its result with the metrics drained from REGISTRY.
+
+    Used to bring the metrics of a worker process back with the result of a task.
+    """
+    return func(*args, **kwargs), REGISTRY.drain()
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "dslsplit_http_requests_total",
+    "Split requests by endpoint, requested method, variant and status code",
+    ("endpoint", "requested_method", "variant", "status"),
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "dslsplit_http_request_duration_seconds",
+    "Latency of split requests by endpoint, requested method and variant",
+    ("endpoint", "requested_method", "variant"),
+)
+WORDS = REGISTRY.counter(
+    "dslsplit_words_total",
+    "Words returned by the webservice by requested and resolved method, variant "
+    "and whether the result was cached",
+    ("requested_method", "resolved_method", "variant", "cache"),
+)
+SPLIT_SECONDS = REGISTRY.histogram(
+    "dslsplit_split_duration_seconds",
+    "Time to split a word that is not cached, by requested and resolved method "
+    "and variant",
+    ("requested_method", "resolved_method", "variant"),
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "dslsplit_stage_duration_seconds",
+    "Time spent per word in careful_scoring, lemma_verification and brute_scoring",
+    ("stage",),
+)
+MODEL_LOAD_SECONDS = REGISTRY.histogram(
+    "dslsplit_model_load_duration_seconds",
+    "Time to load the model artifact and each model in it",
+    ("model",),
+)
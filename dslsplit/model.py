@@ -0,0 +1,583 @@
+"""Versioned model artifact with the careful and brute models and the lemmas.
+
+The artifact is a directory named after a hash of the training data and the
+config it depends on, so a change of the data or config gives a new artifact
+instead of silently using a stale one. It holds:
+
+    manifest.json                format version, data hash, creation time,
+                                 pentagram totals and updates
+    careful_<kind>.ngt           prefix, infix and suffix ngram probabilities
+    careful_<kind>.counts.ngt    prefix, infix and suffix ngram counts
+    brute_<variant>.ngt          pentagram probabilities for each variant
+    brute_<variant>.counts.ngt   pentagram counts for each variant
+    compounds_<variant>.txt      compounds the brute model was trained on
+    gold_<variant>.ngt           split positions of the compounds, see gold
+    lemmas.txt                   lemmas used for training and verifying careful splits
+    simplex.ngt                  lemmas that are not compounds, see simplex
+
+The ngram probabilities and counts are stored as memory-mapped tables (see
+ngram_table), so worker processes share them instead of each holding a copy.
+The counts let update_model add new compounds without retraining.
+"""
+import copy
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from threading import RLock
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping
+
+from dslsplit import CONFIG, logger, timeit
+from dslsplit.brute_split import (
+    count_compounds,
+    data_files,
+    iter_compounds,
+    pentagram_probabilities,
+    training_workers,
+    variants,
+)
+from dslsplit.gold import gold_index, split_mask
+from dslsplit.lexicon import LemmaLexicon
+from dslsplit.metrics import MODEL_LOAD_SECONDS
+from dslsplit.ngram_table import NgramTable, update_table, write_table
+from dslsplit.simplex import simplex_lemmas
+from dslsplit.splitter import Splitter2
+from dslsplit.train_splitter import (
+    NGRAM_KINDS,
+    count_ngrams,
+    ngram_probabilities,
+    train_careful,
+)
+
+FORMAT_VERSION = 5
+MANIFEST = "manifest.json"
+STORAGES = ("mmap", "memory")
+# Files of the probability and count tables of a model
+EXTENSIONS = (".ngt", ".counts.ngt")
+
+current_dir = Path(__file__).resolve().parent
+
+
+class ModelError(Exception):
+    """Raised when a model artifact is missing, invalid or stale."""
+
+
+class ModelChangedError(ModelError):
+    """Raised when loading a model from an artifact that was updated or rebuilt
+    after it was read."""
+
+
+class Model:
+    """Models and lemmas of an artifact, each loaded on first use.
+
+    The careful model, the lemmas and the brute model and gold index of each
+    variant are loaded when first accessed. Loading is thread-safe, so concurrent requests
+    load each of them only once.
+
+    Args:
+        path: Path of the artifact.
+        manifest: Manifest of the artifact.
+        storage: "mmap" or "memory". See read_model.
+    """
+
+    def __init__(self, path: Path, manifest: Dict, storage: str = "mmap"):
+        self.path = path
+        self.manifest = manifest
+        self.storage = storage
+        self.brute = VariantTables(self, "brute")
+        self.gold = VariantTables(self, "gold")
+        self._loaded: Dict[str, Any] = {}
+        self._lock = RLock()
+
+    @property
+    def careful(self) -> Dict[str, Mapping[str, float]]:
+        """Prefix, infix and suffix ngram probabilities."""
+        return self.load(
+            "careful",
+            lambda: {
+                kind: self._read_table(f"careful_{kind}.ngt") for kind in NGRAM_KINDS
+            },
+        )
+
+    @property
+    def lemmas(self) -> LemmaLexicon:
+        """Lemmas used for verifying careful splits."""
+        return self.load("lemmas", self._read_lemmas)
+
+    @property
+    def simplex(self) -> Mapping[str, int]:
+        """Lowercased lemmas that are not compounds."""
+        return self.load("simplex", lambda: self._read_table("simplex.ngt"))
+
+    @property
+    def loaded(self) -> List[str]:
+        """Names of the models loaded so far."""
+        return list(self._loaded)
+
+    def load(self, name: str, loader: Callable[[], Any]) -> Any:
+        """Return the model called name, loading it with loader on first use.
+
+        Raises:
+            ModelError: If the model cannot be loaded.
+        """
+        try:
+            return self._loaded[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._loaded:
+                start = time.perf_counter()
+                try:
+                    with open(self.path / MANIFEST) as f:
+                        changed = json.load(f) != self.manifest
+                    if changed:
+                        raise ModelChangedError(
+                            f"Model at {self.path} has changed since it was read"
+                        )
+                    self._loaded[name] = loader()
+                except (OSError, ValueError) as error:
+                    raise ModelError(f"Model at {self.path} is invalid: {error}")
+                elapsed = time.perf_counter() - start
+                MODEL_LOAD_SECONDS.observe(elapsed, (name,))
+                logger.info(f"Loaded {name} from {self.path} in {elapsed:.6f} seconds")
+            return self._loaded[name]
+
+    def _read_table(self, filename: str) -> Mapping[str, float]:
+        table = NgramTable(self.path / filename)
+        return table if self.storage == "mmap" else dict(table.items())
+
+    def _read_lemmas(self) -> LemmaLexicon:
+        with open(self.path / "lemmas.txt", encoding="utf8") as f:
+            lemmas = LemmaLexicon(line.rstrip("\n") for line in f)
+        if len(lemmas) != self.manifest["lemmas"]:
+            raise ValueError("lemma count differs")
+        return lemmas
+
+
+class VariantTables(Mapping):
+    """Tables of each variant of a model, loaded on first use.
+
+    Args:
+        model: The model.
+        prefix: "brute" for the pentagram probabilities or "gold" for the gold
+            index.
+    """
+
+    def __init__(self, model: Model, prefix: str):
+        self._model = model
+        self._prefix = prefix
+
+    def __getitem__(self, variant: str) -> Mapping[str, float]:
+        if variant not in self._model.manifest["variants"]:
+            raise KeyError(variant)
+        name = f"{self._prefix}_{variant}"
+        return self._model.load(name, lambda: self._model._read_table(f"{name}.ngt"))
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._model.manifest["variants"])
+
+    def __len__(self) -> int:
+        return len(self._model.manifest["variants"])
+
+
+def word_file() -> Path:
+    """Return the lemma file used for the careful model."""
+    return current_dir / CONFIG.get("splitter", "word_file")
+
+
+def model_root(directory: str | Path | None = None) -> Path:
+    """Return the directory holding the artifacts.
+
+    Defaults to directory in the [model] section of the config, or a directory
+    in the system temp directory.
+    """
+    directory = directory or CONFIG.get("model", "directory", fallback="")
+    if not directory:
+        directory = Path(tempfile.gettempdir()) / "dslsplit_model"
+    return Path(directory)
+
+
+def data_hash() -> str:
+    """Return a hash of the training data and the config the models depend on."""
+    digest = hashlib.sha256(f"format {FORMAT_VERSION}\n".encode())
+    digest.update(word_file().read_bytes())
+    for variant in variants():
+        digest.update(f"variant {variant}\n".encode())
+        for filepath, preprocess_method in data_files(variant):
+            digest.update(f"{filepath.name}:{preprocess_method}\n".encode())
+            digest.update(filepath.read_bytes())
+    replacements = CONFIG.get("brute_modernize_danish", "replacements", fallback="")
+    digest.update(f"replacements {replacements}\n".encode())
+    return digest.hexdigest()
+
+
+def write_careful(
+    path: Path,
+    counts: Mapping[str, Mapping[str, int]],
+    probabilities: Mapping[str, Mapping[str, float]] | None = None,
+) -> None:
+    """Write the careful ngram counts and probabilities to an artifact directory.
+
+    The probabilities are computed from the counts if not given.
+    """
+    probabilities = probabilities or ngram_probabilities(counts)
+    for kind in NGRAM_KINDS:
+        write_table(path / f"careful_{kind}.counts.ngt", counts[kind], "I")
+        write_table(path / f"careful_{kind}.ngt", probabilities[kind])
+
+
+def write_brute(
+    path: Path, variant: str, counts: Mapping[str, int], compounds: Iterable[str]
+) -> int:
+    """Write the pentagram counts, probabilities, compounds and gold index of a
+    variant.
+
+    Returns:
+        Total number of pentagrams.
+    """
+    total = sum(counts.values())
+    write_table(path / f"brute_{variant}.counts.ngt", counts, "I")
+    write_table(path / f"brute_{variant}.ngt", pentagram_probabilities(counts, total))
+    compounds = list(compounds)
+    with open(path / f"compounds_{variant}.txt", "w", encoding="utf8") as f:
+        f.writelines(f"{compound}\n" for compound in compounds)
+    write_table(path / f"gold_{variant}.ngt", gold_index(compounds), "I")
+    return total
+
+
+def write_lemmas(path: Path, lemmas: Iterable[str]) -> None:
+    """Write the lemmas sorted to an artifact directory."""
+    with open(path / "lemmas.txt", "w", encoding="utf8") as f:
+        f.writelines(f"{lemma}\n" for lemma in sorted(lemmas))
+
+
+def write_simplex(path: Path, words: Iterable[str]) -> None:
+    """Write the simplex lemmas to an artifact directory."""
+    write_table(path / "simplex.ngt", dict.fromkeys(words, 1), "I")
+
+
+def write_manifest(path: Path, manifest: Dict) -> None:
+    """Write the manifest to an artifact directory."""
+    with open(path / MANIFEST, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def install(build_dir: Path, path: Path) -> None:
+    """Move a complete artifact from build_dir to path, replacing any old one."""
+    if path.exists():
+        old_dir = Path(tempfile.mkdtemp(prefix=".old-", dir=path.parent))
+        os.replace(path, old_dir / path.name)
+        shutil.rmtree(old_dir, ignore_errors=True)
+    try:
+        os.rename(build_dir, path)
+    except OSError:
+        # Another process finished building the same artifact first
+        logger.info(f"Model {path} was built by another process")
+
+
+def update_careful(path: Path, build_dir: Path, delta: Mapping[str, Counter]) -> None:
+    """Write the careful tables of an artifact with the ngram counts in delta added.
+
+    Only the probabilities of the ngrams in delta change, so only those are
+    recomputed and the tables are updated in place of being rewritten.
+
+    Args:
+        path: Path of the artifact.
+        build_dir: Directory to write the tables to.
+        delta: Prefix, infix and suffix counts as returned by count_ngrams.
+    """
+    counts = {
+        kind: NgramTable(path / f"careful_{kind}.counts.ngt") for kind in NGRAM_KINDS
+    }
+    new_counts = {
+        kind: {
+            ngram: counts[kind].get(ngram, 0) + count
+            for ngram, count in delta[kind].items()
+        }
+        for kind in NGRAM_KINDS
+    }
+    probabilities = {kind: {} for kind in NGRAM_KINDS}
+    for ngram in set().union(*delta.values()):
+        kind_counts = {
+            kind: new_counts[kind].get(ngram) or counts[kind].get(ngram, 0)
+            for kind in NGRAM_KINDS
+        }
+        total = sum(kind_counts.values())
+        for kind, count in kind_counts.items():
+            if count:
+                probabilities[kind][ngram] = count / total
+
+    for kind in NGRAM_KINDS:
+        update_table(
+            build_dir / f"careful_{kind}.counts.ngt", counts[kind], new_counts[kind]
+        )
+        update_table(
+            build_dir / f"careful_{kind}.ngt",
+            NgramTable(path / f"careful_{kind}.ngt"),
+            probabilities[kind],
+        )
+
+
+def merge_counts(counts: Mapping[str, int], delta: Counter) -> Dict[str, int]:
+    """Return counts with the counts in delta added."""
+    merged = dict(counts.items())
+    for ngram, count in delta.items():
+        merged[ngram] = merged.get(ngram, 0) + count
+    return merged
+
+
+@timeit
+def build_model(directory: str | Path | None = None, force: bool = False) -> Path:
+    """Train the models and write them as an artifact.
+
+    The artifact is written to a temporary directory and renamed when complete,
+    so a partly written artifact is never loaded.
+
+    Args:
+        directory: Directory holding the artifacts. See model_root.
+        force: If True, rebuild even if an artifact for the data exists.
+
+    Returns:
+        Path of the artifact.
+    """
+    root = model_root(directory)
+    current_hash = data_hash()
+    path = root / current_hash
+    if path.exists() and not force:
+        return path
+
+    root.mkdir(parents=True, exist_ok=True)
+    build_dir = Path(tempfile.mkdtemp(prefix=".build-", dir=root))
+    try:
+        logger.info(f"Building model in {build_dir}")
+        careful = train_careful(word_file())
+        write_careful(build_dir, careful.counts, careful.probabilities)
+        totals = {}
+        gold_compounds = set()
+        for variant in variants():
+            compounds = list(iter_compounds(variant))
+            counts = count_compounds(compounds, training_workers())
+            totals[variant] = write_brute(build_dir, variant, counts, compounds)
+            gold_compounds.update(
+                word for word, mask in gold_index(compounds).items() if mask
+            )
+        write_lemmas(build_dir, careful.lemmas)
+        splitter = Splitter2(
+            ngram_probs=careful.probabilities,
+            language="da",
+            lemma_list=careful.lemmas,
+        )
+        write_simplex(
+            build_dir, simplex_lemmas(careful.lemmas, splitter, gold_compounds)
+        )
+        write_manifest(
+            build_dir,
+            {
+                "format_version": FORMAT_VERSION,
+                "data_hash": current_hash,
+                "created": datetime.now(timezone.utc).isoformat(),
+                "variants": variants(),
+                "lemmas": len(careful.lemmas),
+                "totals": totals,
+                "updates": [],
+            },
+        )
+        install(build_dir, path)
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+    logger.info(f"Model written to {path}")
+    return path
+
+
+@timeit
+def update_model(
+    new_compounds: Iterable[str],
+    directory: str | Path | None = None,
+    update_variants: List[str] | None = None,
+) -> Path:
+    """Add new compounds to the artifact for the current data without retraining.
+
+    Compounds are given like in the brute data files, with "+" between the
+    parts, e.g. "kaffe+kop+holder". The brute models are trained on the
+    compounds, and the careful model and the lemmas on the compounds without
+    "+". The ngram counts of the compounds that are not already in the training
+    data are added to the counts in the artifact, and the probabilities are
+    recomputed from the counts. Only the changed careful ngrams are recomputed,
+    while the smaller brute models are rewritten as their totals change. The
+    compounds are added to the lemmas of the careful model and to the compounds
+    and gold indexes of the brute models, and removed from the simplex lemmas.
+    The artifact is replaced like in build_model.
+
+    Args:
+        new_compounds: Compounds to add, with "+" between the parts.
+        directory: Directory holding the artifacts. See model_root.
+        update_variants: Brute variants to add the compounds to. Defaults to all.
+
+    Returns:
+        Path of the artifact.
+
+    Raises:
+        ModelError: If there is no valid artifact for the current data.
+    """
+    current_hash = data_hash()
+    path = model_root(directory) / current_hash
+    model = read_model(path, current_hash, storage="mmap")
+    manifest = copy.deepcopy(model.manifest)
+    update_variants = update_variants or manifest["variants"]
+    for variant in update_variants:
+        if variant not in manifest["variants"]:
+            raise ValueError(f"Variant {variant} not supported")
+
+    words = list(dict.fromkeys(word.strip() for word in new_compounds))
+    words = [word for word in words if word]
+    new_lemmas = list(dict.fromkeys(word.replace("+", "") for word in words))
+    new_lemmas = [lemma for lemma in new_lemmas if lemma not in model.lemmas]
+    added = {"lemmas": len(new_lemmas)}
+    compounds = {}
+    added_compounds = {}
+    for variant in manifest["variants"]:
+        with open(path / f"compounds_{variant}.txt", encoding="utf8") as f:
+            compounds[variant] = [line.rstrip("\n") for line in f]
+        known = set(compounds[variant])
+        added_compounds[variant] = [
+            word for word in words if variant in update_variants and word not in known
+        ]
+        added[variant] = len(added_compounds[variant])
+    if not any(added.values()):
+        logger.info(f"Model {path} already has all compounds")
+        return path
+
+    build_dir = Path(tempfile.mkdtemp(prefix=".update-", dir=path.parent))
+    try:
+        logger.info(f"Updating model {path} in {build_dir}")
+
+        def keep(*filenames: str) -> None:
+            for filename in filenames:
+                shutil.copy2(path / filename, build_dir / filename)
+
+        if new_lemmas:
+            update_careful(path, build_dir, count_ngrams(new_lemmas))
+        else:
+            keep(
+                *(f"careful_{kind}{ext}" for kind in NGRAM_KINDS for ext in EXTENSIONS)
+            )
+        for variant in manifest["variants"]:
+            new = added_compounds[variant]
+            if not new:
+                keep(
+                    f"compounds_{variant}.txt",
+                    f"gold_{variant}.ngt",
+                    *(f"brute_{variant}{ext}" for ext in EXTENSIONS),
+                )
+                continue
+            counts = merge_counts(
+                NgramTable(path / f"brute_{variant}.counts.ngt"), count_compounds(new)
+            )
+            manifest["totals"][variant] = write_brute(
+                build_dir, variant, counts, compounds[variant] + new
+            )
+
+        lemmas = LemmaLexicon([*model.lemmas, *new_lemmas])
+        write_lemmas(build_dir, lemmas)
+        new_words = {split_mask(word)[0] for word in words}
+        write_simplex(
+            build_dir, (word for word in model.simplex if word not in new_words)
+        )
+        manifest["lemmas"] = len(lemmas)
+        manifest["updates"].append(
+            {"created": datetime.now(timezone.utc).isoformat(), "added": added}
+        )
+        write_manifest(build_dir, manifest)
+        install(build_dir, path)
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+    logger.info(f"Model {path} updated: {added}")
+    return path
+
+
+def read_model(
+    path: str | Path, expected_hash: str | None = None, storage: str | None = None
+) -> Model:
+    """Read and validate an artifact.
+
+    Only the manifest is read, and the existence of the model files checked.
+    The models are loaded on first use, see Model.
+
+    Args:
+        path: Path of the artifact.
+        expected_hash: If given, the data hash the artifact must have been built from.
+        storage: "mmap" to look up the ngram probabilities in the memory-mapped
+            tables, or "memory" to copy them into dictionaries, which is faster
+            but uses more memory in each process. Defaults to storage in the
+            [model] section of the config.
+
+    Raises:
+        ModelError: If the artifact is missing, has another format or is stale.
+    """
+    path = Path(path)
+    try:
+        with open(path / MANIFEST) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise ModelError(f"No model found at {path}")
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ModelError(
+            f"Model at {path} has format {manifest.get('format_version')}, "
+            f"expected {FORMAT_VERSION}"
+        )
+    if expected_hash and manifest.get("data_hash") != expected_hash:
+        raise ModelError(f"Model at {path} is stale")
+    storage = storage or CONFIG.get("model", "storage", fallback="mmap")
+    if storage not in STORAGES:
+        raise ValueError(f"Storage {storage} not supported")
+
+    for key in ("variants", "lemmas"):
+        if key not in manifest:
+            raise ModelError(f"Model at {path} is invalid: missing {key} in manifest")
+    filenames = [f"careful_{kind}.ngt" for kind in NGRAM_KINDS]
+    filenames += [
+        f"{prefix}_{variant}.ngt"
+        for prefix in ("brute", "gold")
+        for variant in manifest["variants"]
+    ]
+    filenames += ["lemmas.txt", "simplex.ngt"]
+    for filename in filenames:
+        if not (path / filename).is_file():
+            raise ModelError(f"Model at {path} is invalid: missing {filename}")
+
+    return Model(path, manifest, storage)
+
+
+@timeit(metric="dslsplit_model_load_duration_seconds", model="artifact")
+def load_model(
+    directory: str | Path | None = None, auto_build: bool | None = None
+) -> Model:
+    """Load the artifact for the current data and config.
+
+    Args:
+        directory: Directory holding the artifacts. See model_root.
+        auto_build: Build the artifact if it is missing or stale. Defaults to
+            auto_build in the [model] section of the config.
+
+    Raises:
+        ModelError: If there is no valid artifact and auto_build is False.
+    """
+    if auto_build is None:
+        auto_build = CONFIG.getboolean("model", "auto_build", fallback=True)
+    current_hash = data_hash()
+    path = model_root(directory) / current_hash
+    try:
+        model = read_model(path, current_hash)
+    except ModelError as error:
+        if not auto_build:
+            raise ModelError(f"{error}. Build it with: dslsplit build-model")
+        logger.info(f"{error}. Building model...")
+        build_model(directory, force=path.exists())
+        model = read_model(path, current_hash)
+    logger.info(f"Model loaded from {path}")
+    return model
@@ -0,0 +1,233 @@
+"""Compact, memory-mapped read-only tables of ngram probabilities or counts.
+
+A table file holds the keys UTF-8 encoded, a float32 probability or
+uint32 count for each key and an open addressing hash table of key indices. The
+file is memory-mapped read-only, so processes using the same file share one
+copy in the page cache.
+
+Layout (little-endian):
+
+    header   magic, number of keys, number of slots, longest key, value type
+    slots    uint32 for each slot, key index + 1 or 0 for an empty slot
+    offsets  uint32 for each key + 1, start of each key in the key data
+    values   float32 ("f") or uint32 ("I") for each key
+    keys     UTF-8 encoded keys, sorted unless added by update_table
+"""
+import mmap
+import struct
+from array import array
+from collections.abc import Mapping
+from itertools import accumulate
+from pathlib import Path
+from typing import Any, Iterator, Mapping as MappingType, Tuple
+from zlib import crc32
+
+MAGIC = b"DSLNGT02"
+HEADER = struct.Struct("<8sIIIc3x")
+VALUE_TYPES = ("f", "I")
+
+
+def write_table(
+    path: str | Path, mapping: MappingType[str, float], value_type: str = "f"
+) -> None:
+    """Write a mapping from strings to numbers as a table file.
+
+    Args:
+        path: Path of the table file.
+        mapping: Mapping to write.
+        value_type: "f" for float32 values or "I" for uint32 counts.
+    """
+    if value_type not in VALUE_TYPES:
+        raise ValueError(f"Value type {value_type} not supported")
+    keys = sorted(mapping)
+    encoded = [key.encode("utf8") for key in keys]
+    offsets = array("I", accumulate(map(len, encoded), initial=0))
+    values = array(value_type, map(mapping.__getitem__, keys))
+
+    # At most half of the slots are used, which keeps the probe sequences short
+    n_slots = 1
+    while n_slots < 2 * len(keys):
+        n_slots *= 2
+    mask = n_slots - 1
+    slots = array("I", bytes(4 * n_slots))
+    for index, slot in enumerate(map(crc32, encoded), 1):
+        slot &= mask
+        while slots[slot]:
+            slot = (slot + 1) & mask
+        slots[slot] = index
+
+    max_key_length = max(map(len, keys), default=0)
+    _write(path, slots, offsets, values, b"".join(encoded), max_key_length)
+
+
+def update_table(
+    path: str | Path, table: "NgramTable", changes: MappingType[str, float]
+) -> None:
+    """Write a copy of a table with the values in changes.
+
+    The index of the table is reused, so the cost depends on the number of
+    changes rather than the size of the table. Keys that are not in the table
+    are added after its keys, so the keys are no longer sorted. If the index
+    would become more than half full, the table is rewritten by write_table.
+
+    Args:
+        path: Path of the new table file.
+        table: Table to copy.
+        changes: Values to set or add.
+    """
+    new_keys = [key for key in changes if key not in table]
+    n_slots = len(table._slots)
+    if 2 * (len(table) + len(new_keys)) > n_slots:
+        merged = dict(table.items())
+        merged.update(changes)
+        write_table(path, merged, table.value_type)
+        return
+
+    slots = array("I")
+    slots.frombytes(table._slots.cast("B"))
+    offsets = array("I")
+    offsets.frombytes(table._offsets.cast("B"))
+    values = array(table.value_type)
+    values.frombytes(table._values.cast("B"))
+    keys = bytearray(table._mmap[table._keys_start :])
+    for key, value in changes.items():
+        index = table._index(key)
+        if index >= 0:
+            values[index] = value
+
+    mask = n_slots - 1
+    for key in new_keys:
+        data = key.encode("utf8")
+        keys += data
+        offsets.append(len(keys))
+        values.append(changes[key])
+        slot = crc32(data) & mask
+        while slots[slot]:
+            slot = (slot + 1) & mask
+        slots[slot] = len(values)
+
+    max_key_length = max([table.max_key_length, *map(len, new_keys)])
+    _write(path, slots, offsets, values, keys, max_key_length)
+
+
+def _write(
+    path: str | Path,
+    slots: array,
+    offsets: array,
+    values: array,
+    keys: bytes,
+    max_key_length: int,
+) -> None:
+    """Write the sections of a table file."""
+    for section in (offsets, values, slots):
+        if section.itemsize != 4:
+            raise RuntimeError("Table sections must have 4 byte items")
+    with open(path, "wb") as f:
+        f.write(
+            HEADER.pack(
+                MAGIC,
+                len(values),
+                len(slots),
+                max_key_length,
+                values.typecode.encode(),
+            )
+        )
+        slots.tofile(f)
+        offsets.tofile(f)
+        values.tofile(f)
+        f.write(keys)
+
+
+class NgramTable(Mapping):
+    """Read-only mapping from ngrams to numbers backed by a table file.
+
+    Lookups work like on a dict, e.g. table.get(ngram, default).
+
+    Args:
+        path: Path of a table file written by write_table.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, n_slots, max_key_length, value_type = HEADER.unpack_from(
+            self._mmap
+        )
+        if magic != MAGIC or value_type.decode() not in VALUE_TYPES:
+            raise ValueError(f"{self.path} is not an ngram table")
+        self.value_type = value_type.decode()
+        self._count = count
+        self._mask = n_slots - 1
+        self.max_key_length = max_key_length
+
+        view = memoryview(self._mmap)
+        start = HEADER.size
+        self._slots = view[start : start + 4 * n_slots].cast("I")
+        start += 4 * n_slots
+        self._offsets = view[start : start + 4 * (count + 1)].cast("I")
+        start += 4 * (count + 1)
+        self._values = view[start : start + 4 * count].cast(self.value_type)
+        self._keys_start = start + 4 * count
+
+    def _index(self, key: str) -> int:
+        """Return the index of key, or -1 if it is not in the table."""
+        data = key.encode("utf8")
+        size = len(data)
+        mask = self._mask
+        slots = self._slots
+        offsets = self._offsets
+        keys = self._mmap
+        keys_start = self._keys_start
+        slot = crc32(data) & mask
+        index = slots[slot]
+        while index:
+            start = offsets[index - 1]
+            if (
+                offsets[index] - start == size
+                and keys[keys_start + start : keys_start + start + size] == data
+            ):
+                return index - 1
+            slot = (slot + 1) & mask
+            index = slots[slot]
+        return -1
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if not isinstance(key, str):
+            return default
+        index = self._index(key)
+        return default if index < 0 else self._values[index]
+
+    def __getitem__(self, key: str) -> float:
+        index = self._index(key) if isinstance(key, str) else -1
+        if index < 0:
+            raise KeyError(key)
+        return self._values[index]
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self._index(key) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        offsets = self._offsets
+        keys_start = self._keys_start
+        for index in range(self._count):
+            start = keys_start + offsets[index]
+            end = keys_start + offsets[index + 1]
+            yield self._mmap[start:end].decode("utf8")
+
+    def items(self) -> Iterator[Tuple[str, float]]:
+        # Reading the values in order is faster than looking up each key
+        return zip(self, self._values)
+
+    def values(self) -> Iterator[float]:
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __reduce__(self):
+        # Worker processes open the file themselves instead of copying the data
+        return self.__class__, (self.path,)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({str(self.path)!r}, {len(self)} ngrams)"
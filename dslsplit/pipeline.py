@@ -0,0 +1,556 @@
+"""Compound splitting pipeline shared by the webservice and the Python API.
+
+The model artifact and each model in it are loaded on first use. The models
+listed in warm_up in the [model] section of the config can be loaded up front
+with warm_up(). reload_models() replaces the models while requests are being
+served: words being split keep using the models they started with.
+"""
+import time
+import unicodedata
+from threading import RLock
+from typing import Any, Container, Dict, Iterable, Iterator, List, Mapping, Tuple
+
+from dslsplit import CONFIG, logger
+from dslsplit.brute_split import split_compound
+from dslsplit.cache import LRUCache
+from dslsplit.decompose import decompose
+from dslsplit.gold import gold_split
+from dslsplit.metrics import SPLIT_SECONDS, STAGE_SECONDS
+from dslsplit.model import (
+    Model,
+    ModelChangedError,
+    ModelError,
+    build_model,
+    load_model,
+)
+from dslsplit.responses import dumps
+from dslsplit.simplex import rejects
+from dslsplit.splitter import Splitter2
+
+METHODS = ("mixed", "careful", "brute")
+VARIANTS = tuple(
+    variant.strip() for variant in CONFIG.get("brute", "variants").split(",")
+)
+MAX_PARTS = CONFIG.getint("splitter", "max_parts", fallback=8)
+LANGUAGES = tuple(
+    language.strip() for language in CONFIG.get("careful", "languages").split(",")
+)
+
+# Description of each method a result can have, e.g. "gold"
+DESCRIPTIONS = {
+    section: CONFIG.get(section, "description")
+    for section in CONFIG.sections()
+    if CONFIG.has_option(section, "description")
+}
+
+# Split results keyed by (normalised word, method, variant, language)
+RESULT_CACHE = LRUCache(CONFIG.getint("cache", "size", fallback=10000))
+
+WARM_UP = tuple(
+    name.strip()
+    for name in CONFIG.get("model", "warm_up", fallback="").split(",")
+    if name.strip()
+)
+VALIDATION_SPLITS = tuple(
+    split.strip()
+    for split in CONFIG.get("model", "validation_splits", fallback="").split(",")
+    if split.strip()
+)
+
+
+class SplitResult:
+    """Splits of a word and the method that produced them.
+
+    Unpacks like a (splits, method) tuple. The JSON of the splits, method and
+    description is rendered on first use and kept, so a cached result is only
+    serialised once however often it is returned.
+    """
+
+    __slots__ = ("splits", "method", "_json")
+
+    def __init__(self, splits: List[Dict[str, Any]], method: str):
+        self.splits = splits
+        self.method = method
+        self._json: bytes | None = None
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter((self.splits, self.method))
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, (SplitResult, tuple)):
+            return NotImplemented
+        return tuple(self) == tuple(other)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.splits!r}, {self.method!r})"
+
+    def __reduce__(self):
+        return self.__class__, (self.splits, self.method)
+
+    def to_json(self, word: str) -> bytes:
+        """Return the response for word as JSON, like make_message."""
+        if self._json is None:
+            self._json = dumps(
+                {
+                    "splits": self.splits,
+                    "method": self.method,
+                    "description": DESCRIPTIONS.get(self.method, ""),
+                }
+            )[1:]
+        return b'{"word":' + dumps(word) + b"," + self._json
+
+
+_lock = RLock()
+# Held while new models are loaded and validated, so only one reload runs
+_reload_lock = RLock()
+_model: Model | None = None
+_splitter: Splitter2 | None = None
+
+
+def get_model() -> Model:
+    """Return the model artifact, loading it on first use."""
+    global _model
+    model = _model
+    if model is None:
+        with _lock:
+            if _model is None:
+                _model = load_model()
+            model = _model
+    return model
+
+
+def get_splitter() -> Splitter2:
+    """Return the careful splitter, loading the careful model on first use."""
+    splitter = _splitter
+    if splitter is None:
+        model = get_model()
+        try:
+            splitter = splitter_for(model)
+        except ModelChangedError as error:
+            reload_changed(model, error)
+            return get_splitter()
+    return splitter
+
+
+def get_brute(variant: str) -> Mapping[str, float]:
+    """Return the brute model of a variant, loading it on first use."""
+    model = get_model()
+    try:
+        return model.brute[variant]
+    except ModelChangedError as error:
+        reload_changed(model, error)
+        return get_model().brute[variant]
+
+
+def get_gold(variant: str) -> Mapping[str, int]:
+    """Return the gold index of a variant, loading it on first use."""
+    model = get_model()
+    try:
+        return model.gold[variant]
+    except ModelChangedError as error:
+        reload_changed(model, error)
+        return get_model().gold[variant]
+
+
+def get_simplex() -> Mapping[str, int]:
+    """Return the simplex lemmas, loading them on first use."""
+    model = get_model()
+    try:
+        return model.simplex
+    except ModelChangedError as error:
+        reload_changed(model, error)
+        return get_model().simplex
+
+
+class Models:
+    """Snapshot of the model artifact and careful splitter in use.
+
+    A word, or a batch of words, is split with one snapshot, so a reload in the
+    middle of it does not mix models from two artifacts. The models in the
+    snapshot are loaded on first use, like those of the artifact.
+
+    Args:
+        model: The model artifact.
+        splitter: The careful splitter of model, if it is already created.
+    """
+
+    __slots__ = ("model", "_splitter")
+
+    def __init__(self, model: Model, splitter: Splitter2 | None = None):
+        self.model = model
+        self._splitter = splitter
+
+    @property
+    def splitter(self) -> Splitter2:
+        """Careful splitter of the model artifact."""
+        if self._splitter is None:
+            self._splitter = splitter_for(self.model)
+        return self._splitter
+
+    @property
+    def simplex(self) -> Mapping[str, int]:
+        return self.model.simplex
+
+    @property
+    def lemmas(self) -> Container[str]:
+        return self.model.lemmas
+
+    def brute(self, variant: str) -> Mapping[str, float]:
+        return self.model.brute[variant]
+
+    def gold(self, variant: str) -> Mapping[str, int]:
+        return self.model.gold[variant]
+
+
+def current_models() -> Models:
+    """Return a snapshot of the models in use."""
+    get_model()
+    with _lock:
+        return Models(_model, _splitter)
+
+
+def splitter_for(model: Model) -> Splitter2:
+    """Return the careful splitter of model, creating it on first use."""
+    global _splitter
+    with _lock:
+        if _model is model and _splitter is not None:
+            return _splitter
+    splitter = Splitter2(
+        ngram_probs=model.careful, language="da", lemma_list=model.lemmas
+    )
+    with _lock:
+        if _model is model:
+            if _splitter is not None:
+                return _splitter
+            _splitter = splitter
+    return splitter
+
+
+def reload_changed(model: Model, error: ModelChangedError) -> None:
+    """Reload the models if model is still in use, after its artifact changed.
+
+    The new models are validated like with reload_models. If a reload is already
+    running, this waits for it and uses the models it swaps in.
+
+    Raises:
+        ModelError: If the new models cannot be loaded or are invalid.
+    """
+    with _reload_lock:
+        if _model is model:
+            logger.info(f"{error}. Reloading the models...")
+            reload_models()
+
+
+def validate_models(
+    model: Model, splitter: Splitter2, variants: Iterable[str] = ()
+) -> None:
+    """Check that loaded models are usable before they replace the current ones.
+
+    The careful tables, the lemmas, the simplex lemmas and the brute model and
+    gold index of each variant must not be empty, and the best split of each
+    compound in validation_splits in the [model] section must be right with the
+    careful method and with the brute method of each variant.
+
+    Raises:
+        ModelError: If a check fails.
+    """
+    checks = {f"careful {kind}": model.careful[kind] for kind in model.careful}
+    checks["lemmas"] = model.lemmas
+    checks["simplex"] = model.simplex
+    for variant in variants:
+        checks[f"brute {variant}"] = model.brute[variant]
+        checks[f"gold {variant}"] = model.gold[variant]
+    for name, table in checks.items():
+        if not len(table):
+            raise ModelError(f"Model at {model.path} is invalid: {name} is empty")
+    for expected in VALIDATION_SPLITS:
+        head, tail = expected.split("+", 1)
+        word = head + tail
+        if splitter.split_compound(word)[0][1] != head:
+            raise ModelError(f"Careful model does not split {word} as {expected}")
+        for variant in variants:
+            splits = split_compound(word, model.brute[variant])["splits"]
+            if not splits or splits[0]["subtokens"][0] != head:
+                raise ModelError(
+                    f"Brute model of {variant} does not split {word} as {expected}"
+                )
+
+
+def reload_models(force_training: bool = False) -> Model:
+    """Load the models again, validate them and swap them in atomically.
+
+    The careful model and the brute models and gold indexes of the variants in
+    warm_up are loaded before the swap, so requests after it do not wait for
+    them. Words being split keep using the old models, and the result cache is
+    cleared after the swap. Meant to run in a background thread while requests
+    are served.
+
+    Args:
+        force_training: If True, rebuild the model artifact first.
+
+    Returns:
+        The new model artifact.
+
+    Raises:
+        ModelError: If the new models cannot be loaded or are invalid. The
+            current models are kept.
+    """
+    global _model, _splitter
+
+    with _reload_lock:
+        if force_training:
+            build_model(force=True)
+        model = load_model()
+        splitter = Splitter2(
+            ngram_probs=model.careful, language="da", lemma_list=model.lemmas
+        )
+        variants = [name for name in WARM_UP if name in VARIANTS]
+        validate_models(model, splitter, variants)
+        with _lock:
+            _model, _splitter = model, splitter
+    RESULT_CACHE.clear()
+    logger.info(f"Reloaded the models from {model.path}")
+    return model
+
+
+def warm_up(names: Iterable[str] | None = None) -> None:
+    """Load models before they are first used.
+
+    Args:
+        names: "careful" and/or brute variants. Defaults to warm_up in the
+            [model] section of the config.
+    """
+    for name in WARM_UP if names is None else names:
+        if name == "careful":
+            get_splitter()
+            get_simplex()
+        elif name in VARIANTS:
+            get_brute(name)
+            get_gold(name)
+        else:
+            raise ValueError(f"Cannot warm up {name}: not careful or a variant")
+
+
+def check_parameters(
+    method: str,
+    variant: str,
+    lang: str,
+    max_parts: int = 2,
+    top_k: int | None = None,
+) -> None:
+    """Raise ValueError if method, variant, language, max_parts or top_k is not
+    supported."""
+    if method not in METHODS:
+        raise ValueError(f"Method {method} not supported")
+    if variant not in VARIANTS:
+        raise ValueError(f"Variant {variant} not supported")
+    if lang not in LANGUAGES:
+        raise ValueError(f"Language {lang} not supported")
+    if not 2 <= max_parts <= MAX_PARTS:
+        raise ValueError(f"max_parts must be between 2 and {MAX_PARTS}")
+    if top_k is not None and top_k < 1:
+        raise ValueError("top_k must be at least 1")
+
+
+def result_key(
+    word: str,
+    method: str,
+    variant: str,
+    lang: str,
+    max_parts: int = 2,
+    top_k: int | None = None,
+) -> Tuple:
+    """Return the cache key for a split request."""
+    word = unicodedata.normalize("NFC", word)
+    return word, method, variant, lang, max_parts, top_k
+
+
+def compute_split(
+    key: Tuple,
+    trace: List[Dict[str, Any]] | None = None,
+    models: Models | None = None,
+) -> SplitResult:
+    """Split a word, bypassing the cache.
+
+    With the mixed method, a word in the gold index of the variant gets its gold
+    split, a word rejected by the simplex fast path (see simplex) gets no splits,
+    and the careful and brute methods are only used for other words. With more
+    than two parts, the parts of a two-part gold split are split further with
+    the careful method, like those of a careful split.
+
+    Args:
+        key: Key as returned by result_key with already checked parameters.
+        trace: If given, the per-pentagram scores of the brute method are added
+            to this list.
+        models: Snapshot of the models to split with. Defaults to the models in
+            use. If the artifact of a given snapshot changed on disk, the
+            ModelChangedError is raised.
+
+    Returns:
+        The splits and the method that produced them.
+    """
+    if models is None:
+        models = current_models()
+        try:
+            return compute_split(key, trace, models)
+        except ModelChangedError as error:
+            reload_changed(models.model, error)
+            if trace:
+                trace.clear()
+            return compute_split(key, trace)
+
+    start = time.perf_counter()
+    word, requested, variant, lang, max_parts, top_k = key
+    method = requested
+    splits = {}
+    if method == "mixed":
+        gold_splits = gold_split(word, models.gold(variant), max_parts, models.lemmas)
+        if gold_splits and max_parts > 2:
+            splitter = models.splitter
+            splitter.language = lang
+            gold_splits = decompose(
+                gold_splits,
+                lambda part: splitter.easy_split(part, min_score=0),
+                max_parts,
+                gain=lambda score: score,
+            )
+        if gold_splits is not None:
+            SPLIT_SECONDS.observe(
+                time.perf_counter() - start, (requested, "gold", variant)
+            )
+            return SplitResult(gold_splits, "gold")
+        if rejects(word, models.simplex):
+            SPLIT_SECONDS.observe(
+                time.perf_counter() - start, (requested, "simplex", variant)
+            )
+            return SplitResult([], "simplex")
+    if method in ("careful", "mixed"):
+        splitter = models.splitter
+        splitter.language = lang
+        # Only splits scoring above 0 are used, so the careful splitter skips
+        # the infix probabilities of positions that cannot score above 0. A
+        # word the careful method cannot split then costs little more than
+        # the brute method alone.
+        splits = splitter.easy_split(
+            word, min_score=0, max_parts=max_parts, top_k=top_k
+        )
+        splits = [split for split in splits if split["score"] > 0]
+        if splits:
+            method = "careful"
+    if not splits and method not in ("careful",):
+        probabilities = models.brute(variant)
+        brute_start = time.perf_counter()
+        brute_split = split_compound(
+            word,
+            probabilities,
+            trace=trace is not None,
+            max_parts=max_parts,
+            top_k=top_k,
+        )
+        STAGE_SECONDS.observe(time.perf_counter() - brute_start, ("brute_scoring",))
+        splits = brute_split.get("splits", [])
+        method = "brute"
+        if trace is not None:
+            trace.extend(brute_split["trace"])
+    SPLIT_SECONDS.observe(time.perf_counter() - start, (requested, method, variant))
+    return SplitResult(splits, method)
+
+
+def compute_splits(keys: List[Tuple]) -> List[SplitResult]:
+    """Split many words with one snapshot of the models, bypassing the cache.
+
+    See compute_split.
+    """
+    models = current_models()
+    try:
+        return [compute_split(key, models=models) for key in keys]
+    except ModelChangedError as error:
+        reload_changed(models.model, error)
+        return compute_splits(keys)
+
+
+def make_message(word: str, result: SplitResult) -> Dict[str, Any]:
+    """Build the response for a word from its splits and method."""
+    splits, method = result
+    return {
+        "word": word,
+        "splits": splits,
+        "method": method,
+        "description": DESCRIPTIONS.get(method, ""),
+    }
+
+
+def split_word(
+    word: str,
+    method: str = "mixed",
+    variant: str = "nudansk",
+    lang: str = "da",
+    max_parts: int = 2,
+    debug: bool = False,
+    top_k: int | None = None,
+) -> Dict[str, Any]:
+    """Split a word into subtokens.
+
+    The splits in the result are shared with the result cache and should not be
+    modified.
+
+    Args:
+        word: Word to split.
+        method: "mixed" (default), "careful" or "brute".
+        variant: "nudansk" (default) or "yngrenydansk".
+        lang: Language (only "da" for Danish is supported).
+        max_parts: Maximum number of parts in a split.
+        debug: If True, bypass the cache and add the per-pentagram scores of the
+            brute method as "trace".
+        top_k: If given, only return the top_k best splits.
+
+    Returns:
+        Dictionary with keys "word", "splits", "description" and "method", and
+        "trace" if debug is True.
+    """
+    check_parameters(method, variant, lang, max_parts, top_k)
+    key = result_key(word, method, variant, lang, max_parts, top_k)
+    if debug:
+        trace = []
+        message = make_message(word, compute_split(key, trace=trace))
+        message["trace"] = trace
+        return message
+
+    generation = RESULT_CACHE.generation
+    result = RESULT_CACHE.get(key)
+    if result is None:
+        result = compute_split(key)
+        RESULT_CACHE.put(key, result, generation)
+    return make_message(word, result)
+
+
+def split_many(
+    words: Iterable[str],
+    method: str = "mixed",
+    variant: str = "nudansk",
+    lang: str = "da",
+    max_parts: int = 2,
+    top_k: int | None = None,
+) -> List[Dict[str, Any]]:
+    """Split many words, splitting each unique word only once.
+
+    Args:
+        words: Words to split.
+        method: "mixed" (default), "careful" or "brute".
+        variant: "nudansk" (default) or "yngrenydansk".
+        lang: Language (only "da" for Danish is supported).
+        max_parts: Maximum number of parts in a split.
+        top_k: If given, only return the top_k best splits of each word.
+
+    Returns:
+        List with a result as returned by split_word for each word, in input order.
+    """
+    check_parameters(method, variant, lang, max_parts, top_k)
+    words = list(words)
+    results = {}
+    for word in words:
+        if word not in results:
+            results[word] = split_word(
+                word, method, variant, lang, max_parts, top_k=top_k
+            )
+    return [results[word] for word in words]
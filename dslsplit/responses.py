@@ -0,0 +1,37 @@
+"""JSON serialisation of the webservice responses.
+
+Responses are serialised with orjson when it is installed, and with the json
+module of the standard library otherwise. Both give the same compact UTF-8
+JSON as the JSONResponse of Starlette.
+"""
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """Serialise content as compact UTF-8 encoded JSON."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serialised with orjson if it is installed.
+
+    Content that is already serialised can be given as bytes, which are sent
+    as they are.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
@@ -0,0 +1,78 @@
+"""Fast rejection of words that are not compounds.
+
+With the mixed method, a word the careful method cannot split is given to the
+brute method, which assumes it is a compound and always splits it. The words
+rejected here get no splits without being scored: words shorter than
+min_length in the [simplex] section of the config, words without letters and
+known simplex lemmas.
+
+A lemma is simplex when it is not a compound in the gold index, it cannot be
+made of two lemmas, with an optional joint element and an inflected second
+part, and the careful method finds no split with a positive score. The simplex
+lemmas are found when the model artifact is built and stored in it.
+"""
+from typing import Container, Iterable, List
+
+from dslsplit import CONFIG
+from dslsplit.brute_split import JOINT_ELEMENTS
+from dslsplit.splitter import Splitter2
+
+MIN_LENGTH = CONFIG.getint("simplex", "min_length", fallback=5)
+# Endings of the second part that are also accepted after a known lemma
+INFLECTIONS = ("e", "r", "er", "en", "et", "ne", "erne", "s", "es", "n", "t")
+MIN_PART_LENGTH = 2
+
+
+def is_lemma_form(part: str, lemmas: Container[str]) -> bool:
+    """Return True if part is a lemma, or a lemma with an inflection ending."""
+    if part in lemmas:
+        return True
+    return any(
+        part.endswith(ending)
+        and len(part) - len(ending) >= MIN_PART_LENGTH
+        and part[: -len(ending)] in lemmas
+        for ending in INFLECTIONS
+    )
+
+
+def is_decomposable(word: str, lemmas: Container[str]) -> bool:
+    """Return True if word is a lemma, an optional joint element and a lemma form."""
+    for i in range(MIN_PART_LENGTH, len(word) - MIN_PART_LENGTH + 1):
+        if word[:i] not in lemmas:
+            continue
+        for joint_element in ("", *JOINT_ELEMENTS):
+            if not word.startswith(joint_element, i):
+                continue
+            tail = word[i + len(joint_element) :]
+            if len(tail) >= MIN_PART_LENGTH and is_lemma_form(tail, lemmas):
+                return True
+    return False
+
+
+def simplex_lemmas(
+    lemmas: Iterable[str], splitter: Splitter2, compounds: Container[str]
+) -> List[str]:
+    """Return the lowercased lemmas that are not compounds.
+
+    Args:
+        lemmas: Lemmas of the careful model.
+        splitter: Careful splitter.
+        compounds: Lowercased compounds of the gold indexes.
+    """
+    words = {lemma.lower() for lemma in lemmas}
+    return sorted(
+        word
+        for word in words
+        if word not in compounds
+        and not is_decomposable(word, words)
+        and splitter.split_compound(word, top_k=1)[0][0] <= 0
+    )
+
+
+def rejects(word: str, simplex: Container[str], min_length: int = MIN_LENGTH) -> bool:
+    """Return True if word is too short, has no letters or is a simplex lemma."""
+    return (
+        len(word) < min_length
+        or not any(map(str.isalpha, word))
+        or word.lower() in simplex
+    )
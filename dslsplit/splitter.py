@@ -1,7 +1,29 @@
 import json
 import re
-from charsplit.splitter import ngram_probs as de_ngram_probs
-from typing import List, Tuple, Dict
+import time
+from functools import lru_cache
+from heapq import heappush, heappushpop
+from operator import itemgetter
+from typing import Iterable, List, Tuple, Dict
+
+from dslsplit import CONFIG
+from dslsplit.decompose import decompose
+from dslsplit.lexicon import LemmaLexicon
+from dslsplit.metrics import STAGE_SECONDS
+
+# Slices shorter than this keep their last character
+FUGE_MIN_LENGTH = 4
+
+
+@lru_cache(maxsize=None)
+def fuge_suffixes(language: str) -> Tuple[str, ...]:
+    """Return the endings where the last character is cut off as a fuge.
+
+    The endings are read from fuge_suffixes in the [careful_LANGUAGE] section
+    of the config. Languages without the option only cut off "s".
+    """
+    suffixes = CONFIG.get(f"careful_{language}", "fuge_suffixes", fallback="s")
+    return tuple(suffix.strip() for suffix in suffixes.split(",") if suffix.strip())
 
 
 class Splitter2:
@@ -11,51 +33,130 @@ class Splitter2:
 
     def __init__(
         self,
-        ngram_probs: dict = de_ngram_probs,
+        ngram_probs: dict | None = None,
         language: str = "de",
-        lemma_list: List | None = None,
+        lemma_list: Iterable[str] | LemmaLexicon | None = None,
     ):
+        if ngram_probs is None:
+            # CharSplit loads its German model when imported, so only import
+            # it when the German model is used
+            from charsplit.splitter import ngram_probs
         self.ngram_probs = ngram_probs
         self.language = language
         self.lemma_list = lemma_list
 
-    def split_compound(self, word: str) -> List[Tuple[float, str, str]]:
+    @property
+    def language(self) -> str:
+        """Language of the splitter, which decides the fuge endings."""
+        return self._language
+
+    @language.setter
+    def language(self, language: str) -> None:
+        self._language = language
+        self.fuge_suffixes = fuge_suffixes(language)
+
+    @property
+    def lemma_list(self) -> LemmaLexicon:
+        """Lemmas used for verifying the parts of a split."""
+        return self._lemma_list
+
+    @lemma_list.setter
+    def lemma_list(self, lemmas: Iterable[str] | LemmaLexicon | None) -> None:
+        self._lemma_list = LemmaLexicon(lemmas)
+
+    @property
+    def ngram_probs(self) -> dict:
+        """Prefix, infix and suffix ngram probabilities."""
+        return self._ngram_probs
+
+    @ngram_probs.setter
+    def ngram_probs(self, ngram_probs: dict) -> None:
+        self._ngram_probs = ngram_probs
+        # Longer ngrams are not in the model and get the default probability
+        infix = ngram_probs["infix"]
+        max_length = getattr(infix, "max_key_length", None)
+        if max_length is None:
+            max_length = max(map(len, infix), default=0)
+        self._max_infix_length = max_length
+
+    def min_infix_probs(self, word: str, start: int = 0) -> List[float]:
+        """Return the lowest infix probability of the ngrams starting at each position.
+
+        For each position n, the infix probabilities of all ngrams word[n:n+k]
+        with at least 3 characters are looked up once. Ngrams not in the model
+        have probability 1, which favors ngrams not occurring within words.
+
+        Args:
+            word: Lower-cased word
+            start: First position to look up. Earlier positions get probability 1.
+
+        Returns:
+            List with the lowest probability for each start position
+        """
+        infix_probs = self.ngram_probs["infix"].get
+        max_length = self._max_infix_length
+        length = len(word)
+        minima = [1] * start
+        for n in range(start, length):
+            end = min(length, n + max_length)
+            probs = [infix_probs(word[n:m], 1) for m in range(n + 3, end + 1)]
+            if not probs or end < length:
+                probs.append(1)
+            minima.append(min(probs))
+        return minima
+
+    def min_infix_prob(self, word: str, n: int) -> float:
+        """Return the lowest infix probability of the ngrams starting at position n.
+
+        Like min_infix_probs, for a single position.
+        """
+        infix_probs = self.ngram_probs["infix"].get
+        length = len(word)
+        end = min(length, n + self._max_infix_length)
+        probs = [infix_probs(word[n:m], 1) for m in range(n + 3, end + 1)]
+        if not probs or end < length:
+            probs.append(1)
+        return min(probs)
+
+    def cut_fuge(self, word_slice: str) -> Tuple[str, str]:
+        """Cut off the last character as fuge if the slice has a fuge ending.
+
+        Args:
+            word_slice: Slice of a word
+
+        Returns:
+            Tuple with the slice without fuge and the fuge ("" if none)
+        """
+        if len(word_slice) >= FUGE_MIN_LENGTH and word_slice.endswith(
+            self.fuge_suffixes
+        ):
+            return word_slice[:-1], word_slice[-1]
+        return word_slice, ""
+
+    def split_compound(
+        self, word: str, top_k: int | None = None, min_score: float | None = None
+    ) -> List[Tuple[float, str, str]]:
         """Return list of possible splits, best first.
 
+        With top_k or min_score, the prefix and suffix probabilities of all
+        split positions are looked up first. They bound the score of each
+        position, as the infix probabilities are not negative, so the infix
+        probabilities are only looked up for the positions that can still be
+        returned.
+
         Args:
             word: Word to be split
+            top_k: If given, only the top_k best splits are returned. They are
+                selected with a heap, and a position is only scored when its
+                bound can beat the k-th best score so far.
+            min_score: If given, only splits scoring above min_score are
+                returned.
 
         Returns:
-            List of all splits
+            List of all splits, or of the top_k best splits. Empty if min_score
+            is given and no split scores above it.
         """
 
-        def cut_fuge(word_slice: str, language: str) -> tuple:
-            min_len = 3
-            end_slices = ["s"]
-            if language == "de":
-                end_slices = ["ts", "gs", "ks", "hls", "ns"]
-
-            elif language == "da":
-                end_slices = [
-                    "teks",
-                    "ions",
-                    "ngs",
-                    "ms",
-                    "ns",
-                    "ds",
-                    "bs",
-                    "vs",
-                    "ls",
-                    "rs",
-                    "js",
-                ]
-
-            if len(word_slice) >= min_len + 1:
-                if any([word_slice.endswith(end_slice) for end_slice in end_slices]):
-                    return word_slice[:-1], word_slice[-1]
-
-            return word_slice, ""
-
         word = word.lower()
 
         # If there is a hyphen in the word, return part of the word behind the last hyphen
@@ -69,66 +170,71 @@ class Splitter2:
             ]
 
         scores = list()  # Score for each possible split position
+        prefix_probs = self.ngram_probs["prefix"].get
+        suffix_probs = self.ngram_probs["suffix"].get
+        bounds = []  # Highest possible score of each position, with top_k or min_score
+        bounded = top_k or min_score is not None
+        pruned = False  # Whether positions were left out for scoring below min_score
+        if not bounded:
+            min_in_probs = self.min_infix_probs(word, start=2)
 
         # Iterate through characters, start at third character, go to 3rd last
         for n in range(2, len(word) - 2):
-            pre_slice = word[:n]
-
             # Cut of Fugen-S
-            pre_slice, fuge = cut_fuge(pre_slice, self.language)
-
-            # Start, in, and end probabilities
-            pre_slice_prob = list()
-            in_slice_prob = list()
-            start_slice_prob = list()
-
-            # Extract all ngrams
-            for k in range(len(word) + 1, 2, -1):
-                # Probability of first compound, given by its ending prob
-                if not pre_slice_prob and k <= len(pre_slice):
-                    # The line above deviates from the description in the thesis;
-                    # it only considers word[:n] as the pre_slice.
-                    # This improves accuracy on GermEval and increases speed.
-                    # Use the line below to replicate the original implementation:
-                    # if k <= len(pre_slice):
-                    end_ngram = pre_slice[-k:]  # Look backwards
-                    pre_slice_prob.append(
-                        self.ngram_probs["suffix"].get(end_ngram, -1)
-                    )  # Punish unlikely pre_slice end_ngram
-
-                # Probability of ngram in word, if high, split unlikely
-                in_ngram = word[n : n + k]
-                in_slice_prob.append(
-                    self.ngram_probs["infix"].get(in_ngram, 1)
-                )  # Favor ngrams not occurring within words
-
-                # Probability of word starting
-                # The condition below deviates from the description in the thesis (see above comments);
-                # Remove the condition to restore the original implementation.
-                if not start_slice_prob:
-                    ngram = word[n : n + k]
-                    # Cut Fugen-S
-                    ngram, fuge2 = cut_fuge(ngram, language=self.language)
-
-                    start_slice_prob.append(self.ngram_probs["prefix"].get(ngram, -1))
-
-            if not pre_slice_prob or not start_slice_prob:
+            pre_slice, fuge = self.cut_fuge(word[:n])
+            if len(pre_slice) < 3:
                 continue
 
-            start_slice_prob = max(start_slice_prob)
-            pre_slice_prob = max(pre_slice_prob)  # Highest, best pre_slice
-            in_slice_prob = min(
-                in_slice_prob
-            )  # Lowest, punish splitting of good in_grams
+            # Probability of first compound, given by its ending prob.
+            # This deviates from the description in the thesis; it only
+            # considers word[:n] and not its shorter endings as the pre_slice.
+            # This improves accuracy on GermEval and increases speed.
+            pre_slice_prob = suffix_probs(pre_slice, -1)  # Punish unlikely ends
+
+            # Probability of word starting. As above, only the whole rest of
+            # the word is considered.
+            start_slice_prob = prefix_probs(self.cut_fuge(word[n:])[0], -1)
+
+            if bounded:
+                # Infix probabilities are not negative, so this bounds the score
+                bound = start_slice_prob + pre_slice_prob
+                if min_score is None or bound > min_score:
+                    bounds.append((bound, n, fuge))
+                else:
+                    pruned = True
+                continue
+
+            # Lowest probability of ngram in word, punish splitting good in_grams
+            in_slice_prob = min_in_probs[n]
+
             score = start_slice_prob - in_slice_prob + pre_slice_prob
             scores.append((score, word[:n], word[n:], fuge))
 
+        # Score the positions with the highest bounds first, and stop when the
+        # bound cannot beat the k-th best score so far
+        if top_k:
+            bounds.sort(key=itemgetter(0), reverse=True)
+        for bound, n, fuge in bounds:
+            if len(scores) == top_k and bound < scores[0][0]:
+                break
+            score = bound - self.min_infix_prob(word, n)
+            if min_score is not None and score <= min_score:
+                pruned = True
+                continue
+            split = (score, word[:n], word[n:], fuge)
+            if not top_k:
+                scores.append(split)
+            elif len(scores) < top_k:
+                heappush(scores, split)
+            else:
+                heappushpop(scores, split)
+
         scores.sort(reverse=True)
 
-        if not scores:
+        if not scores and not pruned:
             scores = [[0, word, word]]
 
-        return sorted(scores, reverse=True)
+        return scores
 
     def load_from_filepath(self, filepath):
         """Load a splitter for compound words.
@@ -145,20 +251,39 @@ class Splitter2:
 
         return self
 
-    def easy_split(self, word: str, min_score: float = -0.2) -> list:
+    def easy_split(
+        self,
+        word: str,
+        min_score: float = -0.2,
+        max_parts: int = 2,
+        top_k: int | None = None,
+    ) -> list:
         """Split compound into words.
 
         Args:
             word: Word to be split
             min_score: Minimum score for a split to be returned
+            max_parts: Maximum number of parts. With more than two parts, the
+                parts of each split are split further where their own best
+                split has a positive score, and "fuges" holds the joint element
+                between each pair of parts.
+            top_k: If given, only the top_k best splits are verified and
+                returned. With more than two parts, splits are split further
+                until there are top_k different decompositions.
 
         Returns:
             List of all splits
         """
-        splits = self.split_compound(word)
+        start = time.perf_counter()
+        splits = self.split_compound(
+            word, top_k=top_k if max_parts <= 2 else None, min_score=min_score
+        )
+        scored = time.perf_counter()
+        STAGE_SECONDS.observe(scored - start, ("careful_scoring",))
         # Lower() because charsplit is developed for German nouns
         output = [(score, split) for score, *split in splits if score > min_score]
 
+        lemmas = self.lemma_list
         verified = []
         for score, item in output:
             ver_items = {"subtokens": []}
@@ -167,25 +292,25 @@ class Splitter2:
             split = item[:-1]
 
             for part in split:
-                if (
-                    part[-1] == "s"
-                    and part not in self.lemma_list
-                    and part[:-1] in self.lemma_list
-                ):
-                    ver_items["subtokens"].append(part[:-1])
-                    ver_items["fuge"] = "s"
-                elif (
-                    part[-1] == "e"
-                    and part not in self.lemma_list
-                    and part[:-1] in self.lemma_list
-                ):
+                # A trailing "s" or "e" that is not part of a known lemma is a fuge
+                if part[-1] in "se" and part not in lemmas and part[:-1] in lemmas:
                     ver_items["subtokens"].append(part[:-1])
-                    ver_items["fuge"] = "e"
+                    ver_items["fuge"] = part[-1]
                 else:
                     ver_items["subtokens"].append(part)
 
             ver_items["score"] = score
             verified.append(ver_items)
+        STAGE_SECONDS.observe(time.perf_counter() - scored, ("lemma_verification",))
+
+        if max_parts > 2:
+            verified = decompose(
+                verified,
+                lambda part: self.easy_split(part, min_score=0),
+                max_parts,
+                gain=lambda score: score,
+                top_k=top_k,
+            )
 
         return (
             verified
@@ -0,0 +1,53 @@
+"""Testing the micro-benchmarks."""
+import pytest
+from pathlib import Path
+
+from dslsplit.benchmark import (
+    BUCKETS,
+    SPLIT_BENCHMARKS,
+    compare,
+    read_run,
+    run_benchmarks,
+    sample_words,
+    write_run,
+)
+
+
+def test_sample_words() -> None:
+    """Test that words are bucketed by length and sampled reproducibly."""
+    words = ["and", "badeand", "operakoncert", "rigsadvokatfuldmægtig"] * 2
+    buckets = sample_words(words, per_bucket=1)
+    assert list(buckets) == [label for label, _, _ in BUCKETS]
+    assert buckets == {
+        "1-6": ["and"],
+        "7-10": ["badeand"],
+        "11-14": ["operakoncert"],
+        "15-19": [],
+        "20+": ["rigsadvokatfuldmægtig"],
+    }
+    words = [f"ord{i}" for i in range(100)]
+    assert sample_words(words, 10, seed=1) == sample_words(words, 10, seed=1)
+
+
+def test_run_benchmarks(tmp_path: Path) -> None:
+    """Test running the splitting benchmarks and comparing runs."""
+    run = run_benchmarks(SPLIT_BENCHMARKS, per_bucket=2, repeat=1)
+    assert [result["name"] for result in run["results"]] == [
+        name for name in SPLIT_BENCHMARKS for _ in BUCKETS
+    ]
+    assert all(result["median"] > 0 for result in run["results"])
+
+    write_run(run, tmp_path / "run.json")
+    baseline = read_run(tmp_path / "run.json")
+    assert baseline == run
+    assert compare(run, baseline) == []
+
+    for result in baseline["results"]:
+        result["median"] /= 2
+    regressions = compare(run, baseline, threshold=0.5)
+    assert len(regressions) == len(run["results"])
+    assert regressions[0]["change"] == pytest.approx(1)
+    assert compare(run, baseline, threshold=1.5) == []
+
+    with pytest.raises(ValueError):
+        run_benchmarks(["careful.unknown"])
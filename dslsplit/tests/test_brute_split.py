@@ -1,4 +1,5 @@
 """Testing fastws brute split and mixed mode."""
+import pytest
 from fastapi import status
 from fastapi.testclient import TestClient
 from os import environ
@@ -6,6 +7,8 @@ from os import environ
 environ["ENABLE_SECURITY"] = "false"
 environ["FASTAPI_SIMPLE_SECURITY_API_KEY_FILE"] = ""
 from dslsplit.app import app
+from dslsplit.brute_split import preprocess_data, split_compound, train_splitter
+from dslsplit.pipeline import MAX_PARTS
 
 client = TestClient(app)
 
@@ -40,3 +43,129 @@ def test_mixed_method() -> None:
         json = response.json()
         assert json.keys() == RESPONSE_KEYS
         assert json["method"] == response_method
+
+
+def test_brute_trace() -> None:
+    """Test the per-pentagram trace of the brute method."""
+    response = client.get("/split/badeand?method=brute")
+    assert "trace" not in response.json()
+
+    response = client.get("/split/badeand?method=brute&debug=true")
+    assert response.status_code == status.HTTP_200_OK
+    json = response.json()
+    assert json.keys() == RESPONSE_KEYS | {"trace"}
+    assert json["trace"][0].keys() == {"candidate", "pentagrams", "score"}
+    assert json["trace"][0]["candidate"] == "b+adeand"
+    assert [item["pentagram"] for item in json["trace"][0]["pentagrams"]] == [
+        "$$b+a",
+        "$b+ad",
+        "b+ade",
+        "+adea",
+    ]
+    scores = {item["candidate"]: item["score"] for item in json["trace"]}
+    for split in json["splits"]:
+        first, last = split["subtokens"]
+        fuge = split["fuge"] and split["fuge"] + "+"
+        assert scores[f"{first}+{fuge}{last}"] == split["score"]
+
+
+def test_brute_scores() -> None:
+    """Test brute scores against the product of the pentagram probabilities."""
+    probabilities = {"bade+": 0.5, "ade+a": 0.25, "de+an": 0.25, "+and_": 0.5}
+    result = split_compound("badeand", probabilities)
+
+    # "bade+and" has all pentagrams but "e+and"
+    best = result["splits"][0]
+    assert best["subtokens"] == ["bade", "and"]
+    candidate = "$$bade+and__"
+    center = len(candidate) / 2
+    expected = 1.0
+    for i in range(4, 9):
+        probability = probabilities.get(candidate[i - 2 : i + 3], 1e-10)
+        expected *= probability * (1 - abs(i - center) / center) ** 2
+    assert abs(best["score"] - expected) / expected < 1e-9
+
+    # Candidates with all five pentagrams unknown are removed
+    subtokens = [split["subtokens"] for split in result["splits"]]
+    assert ["ba", "deand"] not in subtokens
+    assert ["bad", "and"] in subtokens
+
+
+def test_brute_long_compound() -> None:
+    """Test that long compounds keep their candidates despite tiny scores."""
+    word = "rigsadvokatfuldmægtigeksamen" * 10
+    result = split_compound(word, {"at+fu": 0.5, "$$r+i": 0.5})
+    assert result["splits"]
+    assert result["splits"][0]["subtokens"][0].endswith("at")
+
+
+def test_max_parts() -> None:
+    """Test splitting into more than two parts."""
+    word = "rigsadvokatfuldmægtig"
+    for method in ("careful", "brute"):
+        response = client.get(f"/split/{word}?method={method}&max_parts=3")
+        assert response.status_code == status.HTTP_200_OK
+        for split in response.json()["splits"]:
+            assert 2 <= len(split["subtokens"]) <= 3
+            assert len(split["fuges"]) == len(split["subtokens"]) - 1
+            parts = [split["subtokens"][0]]
+            for fuge, part in zip(split["fuges"], split["subtokens"][1:]):
+                parts += [fuge, part]
+            assert "".join(parts) == word
+
+
+def test_parameters() -> None:
+    """Test that unsupported parameters are rejected with a 422."""
+    for query in (
+        "max_parts=1",
+        f"max_parts={MAX_PARTS + 1}",
+        "method=fast",
+        "variant=gammeldansk",
+        "lang=sv",
+    ):
+        assert client.get(f"/split/badeand?{query}").status_code == 422
+        name, value = query.split("=")
+        body = {"words": ["badeand"], name: value}
+        assert client.post("/split", json=body).status_code == 422
+    assert client.get(f"/split/badeand?max_parts={MAX_PARTS}").status_code == (
+        status.HTTP_200_OK
+    )
+
+
+def test_train_splitter() -> None:
+    """Test that chunked and parallel training give the same probabilities."""
+    compounds = ["husarbejde", "sengekant", "badeand", "ålefiskeri", "hus"] * 3
+    probabilities = train_splitter(compounds)
+    assert probabilities["$$hus"] == 6 / sum(len(c) for c in compounds)
+    assert sum(probabilities.values()) == pytest.approx(1)
+    assert train_splitter(iter(compounds), chunk_size=2) == probabilities
+    assert train_splitter(compounds, workers=2, chunk_size=4) == probabilities
+
+
+def test_preprocess_data() -> None:
+    """Test the replacements of the modernize_danish preprocess method."""
+    lines = ["aalefiskeri", "alléen"]
+    assert list(preprocess_data(lines, "modernize_danish")) == ["ålefiskeri", "allen"]
+    assert list(preprocess_data(lines)) == lines
+
+
+def test_top_k() -> None:
+    """Test returning only the top k splits."""
+    probabilities = {"bade+": 0.5, "ade+a": 0.25, "de+an": 0.25, "+and_": 0.5}
+    splits = split_compound("badeand", probabilities)["splits"]
+    assert split_compound("badeand", probabilities, top_k=2)["splits"] == splits[:2]
+
+    for method in ("careful", "brute"):
+        all_splits = client.get(f"/split/skrivebordslampe?method={method}").json()
+        response = client.get(f"/split/skrivebordslampe?method={method}&top_k=1")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["splits"] == all_splits["splits"][:1]
+
+    response = client.post("/split", json={"words": ["badeand"], "top_k": 2})
+    assert len(response.json()[0]["splits"]) == 2
+
+    for top_k in (0, -1):
+        response = client.get(f"/split/badeand?top_k={top_k}")
+        assert response.status_code == 422
+        response = client.post("/split", json={"words": ["badeand"], "top_k": top_k})
+        assert response.status_code == 422
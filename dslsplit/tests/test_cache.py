@@ -0,0 +1,60 @@
+"""Testing the split result cache."""
+from fastapi import status
+from fastapi.testclient import TestClient
+from os import environ
+
+environ["ENABLE_SECURITY"] = "false"
+environ["FASTAPI_SIMPLE_SECURITY_API_KEY_FILE"] = ""
+from dslsplit.app import app
+from dslsplit.cache import LRUCache
+
+client = TestClient(app)
+
+
+def test_lru_cache() -> None:
+    """Test eviction of the least recently used entry."""
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.stats() == {
+        "size": 2,
+        "maxsize": 2,
+        "hits": 2,
+        "misses": 1,
+        "evictions": 1,
+    }
+
+    cache.clear()
+    assert cache.get("a") is None
+    assert not len(cache)
+
+    # Values computed before the cache was cleared are not stored
+    generation = cache.generation
+    cache.clear()
+    cache.put("a", 1, generation)
+    assert cache.get("a") is None
+    cache.put("a", 1, cache.generation)
+    assert cache.get("a") == 1
+
+    disabled = LRUCache(maxsize=0)
+    disabled.put("a", 1)
+    assert disabled.get("a") is None
+
+
+def test_cache_stats() -> None:
+    """Test that repeated requests are served from the cache."""
+    client.get("/split/sengekant?variant=yngrenydansk")
+    before = client.get("/cache").json()
+    first = client.get("/split/sengekant?variant=yngrenydansk").json()
+    second = client.get("/split/sengekant?variant=yngrenydansk").json()
+    after = client.get("/cache").json()
+
+    assert first == second
+    assert after["hits"] - before["hits"] == 2
+    assert after["misses"] == before["misses"]
+    assert client.get("/cache").status_code == status.HTTP_200_OK
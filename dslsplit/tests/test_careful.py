@@ -0,0 +1,83 @@
+"""Testing the careful splitter."""
+import pytest
+
+from dslsplit.splitter import Splitter2, fuge_suffixes
+
+
+def test_cut_fuge() -> None:
+    """Test the configured fuge endings."""
+    assert "teks" in fuge_suffixes("da")
+    assert fuge_suffixes("xx") == ("s",)
+
+    splitter = Splitter2(language="da")
+    assert splitter.cut_fuge("arbejds") == ("arbejd", "s")
+    assert splitter.cut_fuge("løbs") == ("løb", "s")
+    assert splitter.cut_fuge("hus") == ("hus", "")
+    assert splitter.cut_fuge("hats") == ("hats", "")
+
+    splitter.language = "de"
+    assert splitter.cut_fuge("hats") == ("hat", "s")
+    assert splitter.cut_fuge("arbeits") == ("arbeit", "s")
+
+
+def test_min_infix_probs() -> None:
+    """Test the lowest infix probability of the ngrams at each position."""
+    ngram_probs = {
+        "prefix": {"koncert": 0.8},
+        "suffix": {"opera": 0.7},
+        "infix": {"rak": 0.5, "rakon": 0.2, "kon": 0.9, "ncert": 0.1},
+    }
+    splitter = Splitter2(ngram_probs=ngram_probs, language="da")
+    word = "operakoncert"
+    minima = splitter.min_infix_probs(word)
+
+    for n, minimum in enumerate(minima):
+        ngrams = [word[n : n + k] for k in range(3, len(word) - n + 1)]
+        expected = min([ngram_probs["infix"].get(ngram, 1) for ngram in ngrams] + [1])
+        assert minimum == expected
+    assert minima[3] == 0.2
+
+    best = splitter.split_compound(word)[0]
+    assert best[1:] == ("opera", "koncert", "")
+    assert best[0] == pytest.approx(0.8 - 0.9 + 0.7)
+
+
+def test_top_k() -> None:
+    """Test that the top k splits are the first k of all splits."""
+    from dslsplit.evaluation import read_evaluation_data
+    from dslsplit.pipeline import get_splitter
+
+    splitter = get_splitter()
+    splitter.language = "da"
+    words = [word for word, _ in read_evaluation_data()] + ["hus", "kaffe-kop"]
+    for word in words:
+        splits = splitter.split_compound(word)
+        verified = splitter.easy_split(word, max_parts=3)
+        for top_k in (1, 2, 3):
+            assert splitter.split_compound(word, top_k=top_k) == splits[:top_k]
+            assert splitter.easy_split(word, max_parts=3, top_k=top_k) == (
+                verified[:top_k]
+            )
+
+
+def test_min_score() -> None:
+    """Test that pruning by min_score only leaves out splits scoring below it."""
+    from dslsplit.evaluation import read_evaluation_data
+    from dslsplit.pipeline import get_splitter
+
+    splitter = get_splitter()
+    splitter.language = "da"
+    words = [word for word, _ in read_evaluation_data()] + ["hus", "kaffe-kop"]
+    for word in words:
+        splits = splitter.split_compound(word)
+        # Words too short to split get one split of the whole word, scoring 0
+        for min_score in (-0.2, 0) if len(word) > 5 else ():
+            above = [split for split in splits if split[0] > min_score]
+            assert splitter.split_compound(word, min_score=min_score) == above
+            assert splitter.split_compound(word, top_k=2, min_score=min_score) == (
+                above[:2]
+            )
+        assert splitter.easy_split(word, min_score=0) == (
+            [split for split in splitter.easy_split(word) if split["score"] > 0]
+            or [{"subtokens": [word], "score": -1, "fuge": ""}]
+        )
@@ -0,0 +1,51 @@
+"""Testing the command-line interface."""
+import json
+import pytest
+from pathlib import Path
+
+from dslsplit.cli import main, read_words
+from dslsplit.pipeline import split_word
+
+
+def test_read_words() -> None:
+    """Test reading tokens or whole lines."""
+    lines = ["operakoncert  badeand\n", "\n", "rigs advokat\n"]
+    assert list(read_words(lines)) == ["operakoncert", "badeand", "rigs", "advokat"]
+    assert list(read_words(lines, whole_lines=True)) == [
+        "operakoncert  badeand",
+        "rigs advokat",
+    ]
+
+
+def test_split_command(tmp_path: Path) -> None:
+    """Test splitting a file to NDJSON and TSV."""
+    words = ["operakoncert", "badeand", "rigsadvokatfuldmægtig", "operakoncert"]
+    input_file = tmp_path / "words.txt"
+    input_file.write_text(" ".join(words[:2]) + "\n" + " ".join(words[2:]) + "\n")
+
+    output_file = tmp_path / "splits.ndjson"
+    main(
+        [
+            "split",
+            str(input_file),
+            "-w",
+            "1",
+            "--chunk-size",
+            "3",
+            "-o",
+            str(output_file),
+        ]
+    )
+    results = [json.loads(line) for line in output_file.read_text().splitlines()]
+    assert results == [split_word(word) for word in words]
+
+    output_file = tmp_path / "splits.tsv"
+    main(["split", str(input_file), "-w", "2", "-f", "tsv", "-o", str(output_file)])
+    lines = output_file.read_text().splitlines()
+    assert lines[0] == "word\tmethod\tsubtokens\tfuges\tscore"
+    assert [line.split("\t")[0] for line in lines[1:]] == words
+    word, method, subtokens, fuges, score = lines[3].split("\t")
+    assert subtokens.replace("+", "") == word
+
+    with pytest.raises(SystemExit):
+        main(["split", str(input_file), "--max-parts", "1"])
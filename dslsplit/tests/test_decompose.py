@@ -0,0 +1,69 @@
+"""Testing decomposition of compounds into more than two parts."""
+from dslsplit.decompose import decompose
+from dslsplit.pipeline import split_word
+
+SPLITS = {
+    "skrivebordslampe": [
+        (["skrivebord", "lampe"], "s", 0.8),
+        (["skrive", "bordslampe"], "", 0.3),
+    ],
+    "skrivebord": [(["skrive", "bord"], "", 0.5), (["skriv", "ebord"], "", -0.2)],
+    "bordslampe": [(["bord", "lampe"], "s", 0.4)],
+    "skrive": [(["skr", "ive"], "", -0.5)],
+}
+
+calls = []
+
+
+def split_part(part: str) -> list:
+    calls.append(part)
+    return [
+        {"subtokens": subtokens, "fuge": fuge, "score": score}
+        for subtokens, fuge, score in SPLITS.get(part, [])
+    ]
+
+
+def test_decompose() -> None:
+    """Test decomposition with a positive gain for positive scores."""
+    calls.clear()
+    splits = split_part("skrivebordslampe")
+    result = decompose(splits, split_part, 3, gain=lambda score: score)
+
+    assert result[0] == {
+        "subtokens": ["skrive", "bord", "lampe"],
+        "fuge": "s",
+        "fuges": ["", "s"],
+        "score": 0.8,
+    }
+    # The second split has the same parts and is not repeated
+    assert len(result) == 1
+    # Each part is only split once
+    assert len(calls) == len(set(calls))
+
+    result = decompose(splits, split_part, 2, gain=lambda score: score)
+    assert [split["subtokens"] for split in result] == [
+        ["skrivebord", "lampe"],
+        ["skrive", "bordslampe"],
+    ]
+
+    result = decompose(splits, split_part, 3, gain=lambda score: score - 0.6)
+    assert result[0]["subtokens"] == ["skrivebord", "lampe"]
+
+    splits.append({"subtokens": ["skrivebordsl", "ampe"], "fuge": "", "score": 0.1})
+    result = decompose(splits, split_part, 3, gain=lambda score: score, top_k=1)
+    assert [split["subtokens"] for split in result] == [["skrive", "bord", "lampe"]]
+    result = decompose(splits, split_part, 3, gain=lambda score: score, top_k=2)
+    assert [split["subtokens"] for split in result] == [
+        ["skrive", "bord", "lampe"],
+        ["skrivebordsl", "ampe"],
+    ]
+
+
+def test_top_k_decompositions() -> None:
+    """Test that the top_k splits into more than two parts are all different."""
+    for method in ("careful", "brute"):
+        all_splits = split_word("sneboldkamp", method=method, max_parts=3)["splits"]
+        parts = [split["subtokens"] for split in all_splits]
+        assert len(parts) == len(set(map(tuple, parts)))
+        splits = split_word("sneboldkamp", method=method, max_parts=3, top_k=2)
+        assert splits["splits"] == all_splits[:2]
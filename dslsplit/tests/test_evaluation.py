@@ -0,0 +1,69 @@
+"""Testing the evaluation harness."""
+import pytest
+
+from dslsplit.evaluation import (
+    Prediction,
+    Run,
+    evaluate_local,
+    latency_stats,
+    percentile,
+    read_evaluation_data,
+    report,
+    score,
+)
+
+
+def split(*subtokens: str, fuge: str = "") -> dict:
+    return {"subtokens": list(subtokens), "fuge": fuge, "score": 1.0}
+
+
+PREDICTIONS = [
+    Prediction("badeand", "bade+and", [split("bade", "and")], "careful", 0.001),
+    Prediction(
+        "rigsadvokat",
+        "rig+s+advokat",
+        [split("rigs", "advokat"), split("rig", "advokat", fuge="s")],
+        "brute",
+        0.002,
+    ),
+    Prediction("hus", "hu+s", [split("hus")], "careful", 0.003),
+    Prediction("sneboldbane", "snebold+bane", [], "", 0.004),
+]
+
+
+def test_score() -> None:
+    """Test that ignoring the fuge and looking further down count more splits."""
+    scores = report(Run(PREDICTIONS, 0.01))
+    assert [scores[key]["true_positives"] for key in sorted(scores)] == [1, 2, 2, 2]
+    assert scores[False, 1]["false_positives"] == 1
+    assert scores[False, 1]["false_negatives"] == 2
+    assert scores[False, 1]["precision"] == 0.5
+    assert scores[True, 1]["recall"] == pytest.approx(0.5)
+    assert scores[False, 1]["false_positive_words"] == [
+        ("rigsadvokat", "rig+s+advokat", ["rigs+advokat"], "brute")
+    ]
+    assert score([])["precision"] == 0.0
+
+
+def test_latency_stats() -> None:
+    """Test the latency percentiles and throughput."""
+    assert percentile([3.0, 1.0, 2.0, 4.0], 50) == 2.0
+    assert percentile(list(range(1, 101)), 99) == 99
+    assert percentile([], 50) == 0.0
+    stats = latency_stats(Run(PREDICTIONS, 0.5))
+    assert stats["p50_ms"] == pytest.approx(2)
+    assert stats["p99_ms"] == pytest.approx(4)
+    assert stats["words_per_second"] == 8
+
+
+def test_evaluate_local() -> None:
+    """Test a pass over the evaluation data in this process."""
+    data = read_evaluation_data(size=5)
+    assert len(data) == 5
+    run = evaluate_local(data, "brute")
+    assert [prediction.query for prediction in run.predictions] == [
+        query for query, _ in data
+    ]
+    assert all(prediction.method == "brute" for prediction in run.predictions)
+    assert all(prediction.latency > 0 for prediction in run.predictions)
+    assert run.elapsed >= sum(prediction.latency for prediction in run.predictions)
@@ -0,0 +1,94 @@
+"""Testing the execution backend."""
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from os import environ
+
+environ["ENABLE_SECURITY"] = "false"
+environ["FASTAPI_SIMPLE_SECURITY_API_KEY_FILE"] = ""
+from dslsplit import app
+from dslsplit.executor import QueueFullError, SplitExecutor, map_ordered
+
+
+def double(items: list) -> list:
+    return [item * 2 for item in items]
+
+
+def test_thread_executor() -> None:
+    """Test running tasks in the thread pool."""
+    executor = SplitExecutor(backend="thread", workers=2)
+    assert asyncio.run(executor.run(len, "abc")) == 3
+    assert asyncio.run(executor.run_chunked(double, [1, 2, 3, 4, 5], 2)) == [
+        2,
+        4,
+        6,
+        8,
+        10,
+    ]
+    executor.shutdown()
+
+
+def test_executor_bounded_queue() -> None:
+    """Test that tasks are rejected when the queue is full."""
+    executor = SplitExecutor(backend="thread", workers=1, queue_size=0)
+    with pytest.raises(QueueFullError):
+        asyncio.run(executor.run(len, "abc"))
+
+    with pytest.raises(ValueError):
+        SplitExecutor(backend="gpu")
+
+
+def test_map_ordered() -> None:
+    """Test that chunks processed in worker processes are yielded in order."""
+    chunks = ([i, i + 1] for i in range(0, 20, 2))
+    results = list(map_ordered(double, chunks, workers=2, window=3))
+    assert [item for chunk in results for item in chunk] == [i * 2 for i in range(20)]
+    assert list(map_ordered(double, [[1], [2]], workers=1)) == [[2], [4]]
+
+
+def count_words(items: list) -> list:
+    from dslsplit.metrics import WORDS
+
+    WORDS.inc(("test", "test", "test", "miss"), len(items))
+    return items
+
+
+def test_process_executor_metrics() -> None:
+    """Test that metrics recorded in a worker process reach this process."""
+    from dslsplit.metrics import WORDS
+
+    labels = ("test", "test", "test", "miss")
+    before = WORDS.value(labels)
+    executor = SplitExecutor(backend="process", workers=1)
+    assert asyncio.run(executor.run(count_words, [1, 2, 3])) == [1, 2, 3]
+    executor.shutdown()
+    assert WORDS.value(labels) == before + 3
+
+
+def test_process_executor_prepares_model(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the model artifact is built before the worker processes start."""
+    from dslsplit import model, pipeline  # noqa: F401 (pipeline keeps load_model)
+
+    calls = []
+    load_model = model.load_model
+    monkeypatch.setattr(model, "load_model", lambda: calls.append(load_model()))
+    executor = SplitExecutor(backend="process", workers=1)
+    assert asyncio.run(executor.run(len, "abc")) == 3
+    assert len(calls) == 1
+    executor.restart()
+    assert len(calls) == 2
+    executor.shutdown()
+    list(map_ordered(double, [[1], [2]], workers=2))
+    assert len(calls) == 3
+
+
+def test_process_executor_started_before_serving(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that the service starts the process pool before serving requests."""
+    executor = SplitExecutor(backend="process", workers=1)
+    monkeypatch.setattr(app, "split_executor", executor)
+    with TestClient(app.app) as client:
+        assert executor._executor is not None
+        assert client.get("/split/hus").status_code == 200
+    assert executor._executor is None
@@ -0,0 +1,78 @@
+"""Testing the gold index."""
+from dslsplit.gold import MAX_GOLD_LENGTH, gold_index, gold_split, split_mask
+from dslsplit.model import load_model
+from dslsplit.pipeline import split_word
+
+
+def test_split_mask() -> None:
+    """Test the masks of the split positions."""
+    assert split_mask("kaffe+kop") == ("kaffekop", 0b10000)
+    assert split_mask("A+-+bombe") == ("a-bombe", 0b11)
+    assert split_mask("A3-kopi") == ("a3-kopi", 0)
+
+
+def test_gold_split() -> None:
+    """Test splitting words in the gold index."""
+    index = gold_index(
+        [
+            "abonnement+s+afgift",
+            "A+-+bombe",
+            "50-års+fødsel+s+dag",
+            "A3-kopi",
+            "abonnements+afgift",
+            "a" * MAX_GOLD_LENGTH + "+b",
+        ]
+    )
+    assert len(index) == 4
+    assert gold_split("abonnementsafgift", index) == [
+        {"subtokens": ["abonnement", "afgift"], "fuge": "s", "score": 1.0}
+    ]
+    assert gold_split("A-Bombe", index)[0]["subtokens"] == ["A", "Bombe"]
+    assert gold_split("A3-kopi", index) == []
+    assert gold_split("operakoncert", index) is None
+
+    assert gold_split("50-årsfødselsdag", index) is None
+    assert gold_split("50-årsfødselsdag", index, max_parts=3) == [
+        {
+            "subtokens": ["50-års", "fødsel", "dag"],
+            "fuge": "",
+            "fuges": ["", "s"],
+            "score": 1.0,
+        }
+    ]
+
+    fuge_index = gold_index(["skrivebords+lampe", "senge+kant", "hus+båd"])
+    lemmas = {"skrivebord", "lampe", "seng", "hus", "huse", "båd"}
+    assert gold_split("Skrivebordslampe", fuge_index, lemmas=lemmas) == [
+        {"subtokens": ["Skrivebord", "lampe"], "fuge": "s", "score": 1.0}
+    ]
+    assert gold_split("sengekant", fuge_index, lemmas=lemmas)[0]["subtokens"] == [
+        "seng",
+        "kant",
+    ]
+    assert gold_split("husbåd", fuge_index, lemmas=lemmas)[0]["fuge"] == ""
+    assert gold_split("sengekant", fuge_index)[0]["subtokens"] == ["senge", "kant"]
+
+
+def test_gold_method() -> None:
+    """Test that the mixed method uses the gold index of the variant."""
+    model = load_model()
+    assert model.gold["nudansk"]["abonnementsafgift"]
+
+    result = split_word("abonnementsafgift")
+    assert result["method"] == "gold"
+    assert result["description"]
+    assert result["splits"][0]["subtokens"] == ["abonnement", "afgift"]
+    assert split_word("abonnementsafgift", method="careful")["method"] == "careful"
+    assert split_word("operakoncert")["method"] != "gold"
+
+    # The linking letter is the fuge, like with the careful method
+    result = split_word("skrivebordslampe")
+    assert result["method"] == "gold"
+    assert result["splits"][0]["subtokens"] == ["skrivebord", "lampe"]
+    assert result["splits"][0]["fuge"] == "s"
+    # The parts of a gold split are split further like careful splits
+    split = split_word("skrivebordslampe", max_parts=3)["splits"][0]
+    assert split["subtokens"] == ["skrive", "bord", "lampe"]
+    assert split["fuges"] == ["", "s"]
+    assert split_word("abonnementsafgift", max_parts=3)["splits"][0]["fuges"] == ["s"]
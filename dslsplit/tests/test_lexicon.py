@@ -0,0 +1,26 @@
+"""Testing the lemma lexicon used by the careful splitter."""
+from dslsplit.lexicon import LemmaLexicon
+from dslsplit.splitter import Splitter2
+
+
+def test_lexicon_normalises_input() -> None:
+    """Test that the lexicon accepts any iterable and drops empty entries."""
+    lexicon = LemmaLexicon(["bade", "and", "", None, "bade"])  # type: ignore
+
+    assert len(lexicon) == 2
+    assert "bade" in lexicon
+    assert "" not in lexicon
+    assert LemmaLexicon(lexicon) is not lexicon
+    assert set(LemmaLexicon(lexicon)) == {"bade", "and"}
+    assert len(LemmaLexicon()) == 0
+
+
+def test_splitter_uses_lexicon() -> None:
+    """Test that the splitter normalises the lemma list to a lexicon."""
+    splitter = Splitter2(language="da", lemma_list=["skrivebord", "lampe"])
+    assert isinstance(splitter.lemma_list, LemmaLexicon)
+    assert "lampe" in splitter.lemma_list
+
+    splitter.lemma_list = None
+    assert isinstance(splitter.lemma_list, LemmaLexicon)
+    assert not len(splitter.lemma_list)
@@ -0,0 +1,95 @@
+"""Testing the metrics."""
+from fastapi.testclient import TestClient
+from os import environ
+
+environ["ENABLE_SECURITY"] = "false"
+environ["FASTAPI_SIMPLE_SECURITY_API_KEY_FILE"] = ""
+from dslsplit import timeit
+from dslsplit.app import app
+from dslsplit.metrics import REGISTRY, Counter, Histogram, Registry, collect
+from dslsplit.pipeline import RESULT_CACHE
+
+client = TestClient(app)
+
+
+def test_registry() -> None:
+    """Test the text format and merging the metrics of a worker."""
+    registry = Registry()
+    counter = registry.counter("words_total", "Words", ("method",))
+    histogram = registry.histogram("seconds", "Latency", ("stage",), (0.1, 1.0))
+    counter.inc(("brute",))
+    counter.inc(("brute",), 2)
+    counter.inc(('a"b',))
+    histogram.observe(0.05, ("scoring",))
+    histogram.observe(0.5, ("scoring",))
+    histogram.observe(5.0, ("scoring",))
+
+    assert registry.render().splitlines() == [
+        "# HELP words_total Words",
+        "# TYPE words_total counter",
+        'words_total{method="a\\"b"} 1',
+        'words_total{method="brute"} 3',
+        "# HELP seconds Latency",
+        "# TYPE seconds histogram",
+        'seconds_bucket{stage="scoring",le="0.1"} 1',
+        'seconds_bucket{stage="scoring",le="1"} 2',
+        'seconds_bucket{stage="scoring",le="+Inf"} 3',
+        'seconds_sum{stage="scoring"} 5.55',
+        'seconds_count{stage="scoring"} 3',
+    ]
+
+    worker = Registry()
+    worker.register(Counter("words_total", "Words", ("method",)))
+    worker.register(Histogram("seconds", "Latency", ("stage",), (0.1, 1.0)))
+    worker.metrics["words_total"].inc(("brute",))
+    worker.metrics["seconds"].observe(0.5, ("scoring",))
+    registry.merge(worker.drain())
+    assert worker.drain() == {}
+    assert counter.value(("brute",)) == 4
+    assert histogram.count(("scoring",)) == 4
+
+
+def test_timeit_metric() -> None:
+    """Test that timeit observes the time in a histogram."""
+    from dslsplit.metrics import MODEL_LOAD_SECONDS
+
+    @timeit(metric="dslsplit_model_load_duration_seconds", model="test")
+    def load(value: int) -> int:
+        return value + 1
+
+    before = MODEL_LOAD_SECONDS.count(("test",))
+    assert load(1) == 2
+    assert MODEL_LOAD_SECONDS.count(("test",)) == before + 1
+
+    result, metrics = collect(load, 2)
+    assert result == 3
+    assert metrics["dslsplit_model_load_duration_seconds"][("test",)][0]
+    assert MODEL_LOAD_SECONDS.count(("test",)) == 0
+    REGISTRY.merge(metrics)
+    assert MODEL_LOAD_SECONDS.count(("test",)) == before + 2
+
+
+def test_metrics_endpoint() -> None:
+    """Test that split requests show up in /metrics."""
+    RESULT_CACHE.clear()
+    client.get("/split/rigsadvokat?method=brute")
+    client.post("/split", json={"words": ["badeand", "badeand"]})
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+
+    text = response.text
+    assert (
+        'dslsplit_http_requests_total{endpoint="/split/{word}",'
+        'requested_method="brute",variant="nudansk",status="200"}'
+    ) in text
+    assert (
+        'dslsplit_words_total{requested_method="brute",resolved_method="brute",'
+        'variant="nudansk",cache="miss"}'
+    ) in text
+    assert 'dslsplit_words_total{requested_method="mixed"' in text
+    assert 'dslsplit_http_request_duration_seconds_count{endpoint="/split"' in text
+    for stage in ("careful_scoring", "lemma_verification", "brute_scoring"):
+        assert f'dslsplit_stage_duration_seconds_count{{stage="{stage}"}}' in text
+    assert 'dslsplit_model_load_duration_seconds_count{model="careful"}' in text
+    assert "dslsplit_cache_hits_total " in text
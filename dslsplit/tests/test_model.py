@@ -0,0 +1,129 @@
+"""Testing the model artifact."""
+import json
+import shutil
+import pytest
+from pathlib import Path
+
+from dslsplit.brute_split import count_pentagrams
+from dslsplit.model import (
+    ModelChangedError,
+    ModelError,
+    data_hash,
+    load_model,
+    model_root,
+    read_model,
+    update_model,
+)
+from dslsplit.ngram_table import NgramTable
+from dslsplit.train_splitter import count_ngrams
+
+
+def test_load_model() -> None:
+    """Test loading the model artifact for the current data."""
+    model = load_model()
+
+    assert model.manifest["data_hash"] == data_hash()
+    assert model.path == model_root() / data_hash()
+    assert set(model.careful) == {"prefix", "infix", "suffix"}
+    assert set(model.brute) == {"nudansk", "yngrenydansk"}
+    assert "koncert" in model.lemmas
+
+
+def test_lazy_model() -> None:
+    """Test that the models of an artifact are loaded on first use."""
+    model = read_model(load_model().path)
+    assert model.loaded == []
+
+    assert model.brute["yngrenydansk"].get("$$hus") is not None
+    assert model.loaded == ["brute_yngrenydansk"]
+    assert model.brute["yngrenydansk"] is model.brute["yngrenydansk"]
+    with pytest.raises(KeyError):
+        model.brute["missing"]
+
+    assert "koncert" in model.lemmas
+    assert set(model.careful) == {"prefix", "infix", "suffix"}
+    assert sorted(model.loaded) == ["brute_yngrenydansk", "careful", "lemmas"]
+
+
+def test_invalid_model(tmp_path: Path) -> None:
+    """Test that missing and stale artifacts are rejected."""
+    with pytest.raises(ModelError):
+        read_model(tmp_path / "missing")
+
+    with pytest.raises(ModelError):
+        load_model(tmp_path, auto_build=False)
+
+    path = tmp_path / "model"
+    shutil.copytree(load_model().path, path)
+    assert read_model(path, data_hash()).manifest["data_hash"] == data_hash()
+
+    with pytest.raises(ModelError):
+        read_model(path, "0" * 64)
+
+    (path / "brute_nudansk.ngt").unlink()
+    with pytest.raises(ModelError):
+        read_model(path)
+
+    manifest = json.loads((path / "manifest.json").read_text())
+    manifest["format_version"] = 0
+    (path / "manifest.json").write_text(json.dumps(manifest))
+    with pytest.raises(ModelError):
+        read_model(path)
+
+
+def test_update_model(tmp_path: Path) -> None:
+    """Test adding new compounds to a copy of the model artifact."""
+    path = tmp_path / data_hash()
+    shutil.copytree(load_model().path, path)
+    old = read_model(path)
+    old_lemmas = len(old.lemmas)
+    old_yngrenydansk = dict(old.brute["yngrenydansk"])
+    old_counts = NgramTable(path / "careful_prefix.counts.ngt")
+    old_brute_counts = NgramTable(path / "brute_nudansk.counts.ngt")
+    words = ["kaffe+kop+holder", "sne+bold+dommer", "aarhus+historie"]
+    new_words = words[:2]
+    new_lemmas = ["kaffekopholder", "snebolddommer"]
+
+    assert update_model(words, tmp_path, ["nudansk"]) == path
+    model = read_model(path, data_hash())
+    assert model.manifest["updates"][-1]["added"] == {
+        "lemmas": 2,
+        "nudansk": 2,
+        "yngrenydansk": 0,
+    }
+    assert all(lemma in model.lemmas for lemma in new_lemmas)
+    assert len(model.lemmas) == old_lemmas + 2
+
+    # The counts of the new compounds are added and the probabilities renormalised
+    counts = NgramTable(path / "careful_prefix.counts.ngt")
+    delta = count_ngrams(new_lemmas)["prefix"]
+    for ngram in ("kaffe", "kaffekop", "snebolddommer"):
+        assert counts[ngram] == old_counts.get(ngram, 0) + delta[ngram]
+    # The whole word is counted as both a prefix and a suffix
+    assert model.careful["prefix"].get("kaffekopholder") == 0.5
+
+    brute_counts = NgramTable(path / "brute_nudansk.counts.ngt")
+    delta = count_pentagrams(new_words)
+    total = model.manifest["totals"]["nudansk"]
+    assert total == old.manifest["totals"]["nudansk"] + sum(delta.values())
+    assert brute_counts["ffe+k"] == old_brute_counts.get("ffe+k", 0) + 1
+    assert model.brute["nudansk"]["ffe+k"] == pytest.approx(
+        brute_counts["ffe+k"] / total, rel=1e-6
+    )
+    assert dict(model.brute["yngrenydansk"]) == old_yngrenydansk
+    assert model.gold["nudansk"]["kaffekopholder"] == 0b10010000
+    assert "kaffekopholder" not in model.gold["yngrenydansk"]
+
+    # Models not loaded before the update are not mixed with the updated ones
+    with pytest.raises(ModelChangedError):
+        old.brute["nudansk"]
+
+    # Compounds already in the model are not counted again
+    update_model(words, tmp_path)
+    assert read_model(path).manifest["updates"][-1]["added"] == {
+        "lemmas": 0,
+        "nudansk": 0,
+        "yngrenydansk": 3,
+    }
+    update_model(words, tmp_path)
+    assert len(read_model(path).manifest["updates"]) == 2
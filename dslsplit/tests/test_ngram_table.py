@@ -0,0 +1,67 @@
+"""Testing the memory-mapped ngram tables."""
+import pickle
+import pytest
+from pathlib import Path
+
+from dslsplit.ngram_table import NgramTable, update_table, write_table
+
+
+def test_ngram_table(tmp_path: Path) -> None:
+    """Test that a table looks up like the dictionary it was written from."""
+    probabilities = {f"ng{i}": i / 1000 for i in range(1000)}
+    probabilities.update({"æble": 0.5, "sødt": -0.25, "": 1.0})
+    write_table(tmp_path / "table.ngt", probabilities)
+    table = NgramTable(tmp_path / "table.ngt")
+
+    assert len(table) == len(probabilities)
+    assert list(table) == sorted(probabilities)
+    assert table.max_key_length == 5
+    for ngram, probability in probabilities.items():
+        assert table[ngram] == pytest.approx(probability, abs=1e-6)
+    assert table.get("æble") == 0.5
+    assert table.get("missing", -1) == -1
+    assert table.get(None, -1) == -1
+    assert "sødt" in table
+    assert "søde" not in table
+    with pytest.raises(KeyError):
+        table["missing"]
+
+    copy = pickle.loads(pickle.dumps(table))
+    assert copy.path == table.path
+    assert dict(copy) == dict(table)
+
+
+def test_empty_ngram_table(tmp_path: Path) -> None:
+    """Test a table without ngrams."""
+    write_table(tmp_path / "empty.ngt", {})
+    table = NgramTable(tmp_path / "empty.ngt")
+
+    assert len(table) == 0
+    assert table.get("a") is None
+    assert table.max_key_length == 0
+
+
+def test_invalid_ngram_table(tmp_path: Path) -> None:
+    """Test that other files are rejected."""
+    (tmp_path / "other.ngt").write_bytes(b"x" * 100)
+    with pytest.raises(ValueError):
+        NgramTable(tmp_path / "other.ngt")
+
+
+def test_update_table(tmp_path: Path) -> None:
+    """Test that an updated table has the changed and added values."""
+    counts = {f"ng{i}": i for i in range(100)}
+    write_table(tmp_path / "counts.ngt", counts, "I")
+    table = NgramTable(tmp_path / "counts.ngt")
+    assert table.value_type == "I"
+
+    changes = {"ng1": 10, "ng99": 0, "æblekage": 7}
+    update_table(tmp_path / "updated.ngt", table, changes)
+    updated = NgramTable(tmp_path / "updated.ngt")
+    assert dict(updated) == {**counts, **changes}
+    assert updated.max_key_length == 8
+
+    # More keys than the index has room for rewrites the table
+    changes = {f"new{i}": i for i in range(200)}
+    update_table(tmp_path / "rewritten.ngt", updated, changes)
+    assert dict(NgramTable(tmp_path / "rewritten.ngt")) == {**dict(updated), **changes}
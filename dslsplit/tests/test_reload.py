@@ -0,0 +1,134 @@
+"""Testing reloading the models while the service runs."""
+import time
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from os import environ
+
+environ["ENABLE_SECURITY"] = "false"
+environ["FASTAPI_SIMPLE_SECURITY_API_KEY_FILE"] = ""
+environ.setdefault("FASTAPI_SIMPLE_SECURITY_SECRET", "test-secret")
+from dslsplit import pipeline
+from dslsplit.app import app
+from dslsplit.model import Model, ModelError
+from dslsplit.pipeline import (
+    RESULT_CACHE,
+    compute_splits,
+    get_model,
+    get_splitter,
+    reload_models,
+    result_key,
+    validate_models,
+)
+from dslsplit.splitter import Splitter2
+
+client = TestClient(app)
+SECRET = {"secret-key": environ["FASTAPI_SIMPLE_SECURITY_SECRET"]}
+
+
+def test_reload_endpoint() -> None:
+    """Test that a reload swaps in new models and clears the cache."""
+    assert client.post("/admin/reload").status_code == status.HTTP_403_FORBIDDEN
+    assert client.get("/admin/reload").status_code == status.HTTP_403_FORBIDDEN
+    wrong = {"secret-key": SECRET["secret-key"] + "x"}
+    assert client.get("/admin/reload", headers=wrong).status_code == (
+        status.HTTP_403_FORBIDDEN
+    )
+
+    before = client.get("/split/sengekant").json()
+    splitter = get_splitter()
+    assert len(RESULT_CACHE)
+
+    response = client.post("/admin/reload", headers=SECRET)
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert response.json()["state"] in ("running", "done")
+    for _ in range(100):
+        state = client.get("/admin/reload", headers=SECRET).json()
+        if state["state"] != "running":
+            break
+        time.sleep(0.1)
+    assert state["state"] == "done"
+    assert state["model"] == str(get_model().path)
+
+    assert get_splitter() is not splitter
+    assert not len(RESULT_CACHE)
+    assert client.get("/split/sengekant").json() == before
+
+
+def test_validate_models() -> None:
+    """Test that models that cannot split are rejected."""
+    model = reload_models()
+    validate_models(model, get_splitter(), ["nudansk"])
+
+    empty = {"prefix": {}, "infix": {}, "suffix": {}}
+    splitter = Splitter2(ngram_probs=empty, language="da", lemma_list=[])
+    with pytest.raises(ModelError):
+        validate_models(model, splitter)
+
+
+def test_reload_during_batch(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that a batch keeps using its models when they are reloaded midway."""
+    old_model, old_splitter = get_model(), get_splitter()
+    used = []
+    reloading = []
+
+    def record(func, position=1):
+        def wrapper(*args, **kwargs):
+            if not reloading:
+                # Swap in new models while the first word is being split
+                reloading.append(True)
+                reload_models()
+                reloading.append(False)
+            if not reloading[-1]:
+                used.append(args[position])
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    monkeypatch.setattr(pipeline, "gold_split", record(pipeline.gold_split))
+    monkeypatch.setattr(pipeline, "rejects", record(pipeline.rejects))
+    monkeypatch.setattr(pipeline, "split_compound", record(pipeline.split_compound))
+    monkeypatch.setattr(Splitter2, "easy_split", record(Splitter2.easy_split, 0))
+    words = ["abonnementsafgift", "hus", "afgangsfilm", "badeand"] * 2
+    results = compute_splits(
+        [result_key(word, "mixed", "nudansk", "da") for word in words]
+    )
+
+    assert get_model() is not old_model
+    assert [result.method for result in results[:4]] == [
+        "gold",
+        "simplex",
+        "careful",
+        "brute",
+    ]
+    old = {
+        id(old_model.gold["nudansk"]),
+        id(old_model.simplex),
+        id(old_splitter),
+        id(old_model.brute["nudansk"]),
+    }
+    assert {id(model) for model in used} == old
+
+
+def test_reload_changed_validates(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that models reloaded after the artifact changed must be valid."""
+    current = get_model()
+    # A model whose artifact changed on disk since it was read
+    changed = Model(current.path, {**current.manifest, "changed": True})
+    monkeypatch.setattr(pipeline, "_model", changed)
+    monkeypatch.setattr(pipeline, "_splitter", None)
+
+    def invalid(*args, **kwargs):
+        raise ModelError("invalid")
+
+    monkeypatch.setattr(pipeline, "validate_models", invalid)
+    with pytest.raises(ModelError, match="invalid"):
+        compute_splits([result_key("abonnementsafgift", "mixed", "nudansk", "da")])
+    assert get_model() is changed
+
+    monkeypatch.setattr(pipeline, "validate_models", validate_models)
+    results = compute_splits(
+        [result_key("abonnementsafgift", "mixed", "nudansk", "da")]
+    )
+    assert results[0].method == "gold"
+    assert get_model() is not changed
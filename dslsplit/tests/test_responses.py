@@ -0,0 +1,50 @@
+"""Testing the serialisation of the responses."""
+import json
+import pickle
+import pytest
+from fastapi.testclient import TestClient
+from os import environ
+
+environ["ENABLE_SECURITY"] = "false"
+environ["FASTAPI_SIMPLE_SECURITY_API_KEY_FILE"] = ""
+from dslsplit import responses
+from dslsplit.app import app
+from dslsplit.pipeline import compute_split, make_message, result_key, split_many
+
+client = TestClient(app)
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_dumps(fast: bool, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that orjson and the fallback give the same JSON as JSONResponse."""
+    if not fast:
+        monkeypatch.setattr(responses, "orjson", None)
+    elif responses.orjson is None:
+        pytest.skip("orjson is not installed")
+    content = {"word": "ålefiskeri", "splits": [{"score": 0.5, "fuges": ["", "s"]}]}
+    expected = responses.JSONResponse(content).body
+    assert responses.dumps(content) == expected
+    assert responses.FastJSONResponse(content).body == expected
+    assert responses.FastJSONResponse(b"[]").body == b"[]"
+
+
+def test_split_result() -> None:
+    """Test that a split result unpacks and serialises like its message."""
+    for word in ("abonnementsafgift", "hus", "operakoncert", "Operakoncert"):
+        result = compute_split(result_key(word, "mixed", "nudansk", "da", 3))
+        splits, method = result
+        assert result == (splits, method)
+        assert json.loads(result.to_json(word)) == make_message(word, result)
+        # The JSON rendered before pickling is not sent to or from worker processes
+        copy = pickle.loads(pickle.dumps(result))
+        assert copy == result and copy._json is None
+
+
+def test_split_response() -> None:
+    """Test that the webservice returns the messages of split_many."""
+    words = ["operakoncert", "hus", "abonnementsafgift", "operakoncert"]
+    expected = json.loads(json.dumps(split_many(words)))
+    response = client.post("/split", json={"words": words})
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == expected
+    assert client.get("/split/hus").json() == expected[1]
@@ -0,0 +1,45 @@
+"""Testing the fast rejection of words that are not compounds."""
+from dslsplit.evaluation import read_evaluation_data
+from dslsplit.model import load_model
+from dslsplit.pipeline import get_splitter, split_word
+from dslsplit.simplex import is_decomposable, rejects, simplex_lemmas
+
+
+def test_is_decomposable() -> None:
+    """Test decomposing words into lemmas."""
+    lemmas = {"kaffe", "kop", "abonnement", "afgift", "hus", "båd"}
+    assert is_decomposable("kaffekop", lemmas)
+    assert not is_decomposable("kaffekoppen", lemmas)
+    assert is_decomposable("abonnementsafgift", lemmas)
+    assert is_decomposable("husbåde", lemmas)
+    assert not is_decomposable("bungalow", lemmas)
+
+
+def test_simplex_lemmas() -> None:
+    """Test that compounds are not simplex lemmas."""
+    splitter = get_splitter()
+    splitter.language = "da"
+    lemmas = ["bungalow", "Rejse", "kaffe", "kop", "kaffekop", "husarbejde"]
+    assert simplex_lemmas(lemmas, splitter, {"husarbejde"}) == [
+        "bungalow",
+        "kaffe",
+        "kop",
+        "rejse",
+    ]
+
+
+def test_rejects() -> None:
+    """Test the fast path of the mixed method."""
+    simplex = load_model().simplex
+    assert rejects("hus", simplex)
+    assert rejects("2023-24", simplex)
+    assert rejects("Bungalow", simplex)
+    assert not rejects("operakoncert", simplex)
+    # No compound in the evaluation data is rejected
+    assert not any(rejects(word, simplex) for word, _ in read_evaluation_data())
+
+    result = split_word("bungalow")
+    assert result["method"] == "simplex"
+    assert result["splits"] == []
+    assert result["description"]
+    assert split_word("bungalow", method="brute")["splits"]
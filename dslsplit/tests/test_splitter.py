@@ -9,7 +9,7 @@ from pathlib import Path
 environ["ENABLE_SECURITY"] = "false"
 environ["FASTAPI_SIMPLE_SECURITY_API_KEY_FILE"] = ""
 from dslsplit.app import app
-from dslsplit.train_splitter import train_splitter
+from dslsplit.train_splitter import train_careful, train_splitter
 
 
 client = TestClient(app)
@@ -23,7 +23,7 @@ def test_spliiter() -> None:
     response = client.get("/split")
 
     # BAD TEST CASES
-    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
 
     # GOOD TEST CASES
     response = client.get(f"/split/{test_lemmas[0]}")
@@ -46,6 +46,23 @@ def test_spliiter() -> None:
     }
 
 
+def test_batch_splitter() -> None:
+    """Test batch compound splitter API"""
+    words = ["operakoncert", "badeand", "operakoncert"]
+
+    response = client.post("/split", json={"words": words})
+
+    assert response.status_code == status.HTTP_200_OK
+
+    results = response.json()
+    assert [result["word"] for result in results] == words
+    for word, result in zip(words, results):
+        assert result == client.get(f"/split/{word}").json()
+
+    response = client.post("/split", json={"words": words, "method": "brute"})
+    assert {result["method"] for result in response.json()} == {"brute"}
+
+
 def test_training_splitter() -> None:
     """Test training of compound splitter from file."""
 
@@ -80,3 +97,24 @@ def test_training_splitter() -> None:
     assert len(ngram_probs.get("prefix", {}))
     assert len(ngram_probs.get("infix", {}))
     assert len(ngram_probs.get("suffix", {}))
+
+
+def test_train_careful() -> None:
+    """Test training of the careful model with the lemmas returned."""
+    input_file = current_dir / "lemma_liste_test.csv"
+    model = train_careful(input_file)
+
+    assert "testkørsel" in model.lemmas
+    assert "sb." not in model.lemmas
+    for kind in ("prefix", "infix", "suffix"):
+        assert model.probabilities[kind]
+        assert set(model.probabilities[kind]) == set(model.counts[kind])
+    assert model.probabilities["prefix"]["tes"] == 1
+
+    with pytest.raises(ValueError):
+        train_careful(input_file, column=5)
+
+    # The probabilities are written as UTF-8, not escaped
+    prob_file = train_splitter(str(input_file), "test", delimiter=";")
+    with open(prob_file, encoding="utf8") as f:
+        assert "kør" in f.read()
@@ -1,12 +1,127 @@
 import argparse
+import csv
 import os
+import re
 import tempfile
 import json
-import pandas as pd
-from charsplit import training
+from collections import Counter
+from itertools import chain
 from pathlib import Path
+from typing import Dict, Iterable, Iterator, Mapping, NamedTuple
+
+from dslsplit.lexicon import LemmaLexicon
 
 current_dir = Path(__file__).parent.resolve()
+NGRAM_KINDS = ("prefix", "infix", "suffix")
+
+
+def count_ngrams(words: Iterable[str]) -> Dict[str, Counter]:
+    """Count the prefix, infix and suffix ngrams of words as CharSplit does.
+
+    Words are lowercased, and only the part after the last hyphen is used. Each
+    prefix and suffix of at least three characters is counted, and so is each
+    infix of at least three characters that neither starts nor ends the word.
+
+    Args:
+        words: Words to count the ngrams of.
+
+    Returns:
+        Dictionary with a Counter for each of "prefix", "infix" and "suffix".
+    """
+    words = [re.sub(".*-", "", word.strip().lower()) for word in words]
+    prefix = Counter(
+        chain.from_iterable(
+            [word[:n] for n in range(3, len(word) + 1)] for word in words
+        )
+    )
+    suffix = Counter(
+        chain.from_iterable(
+            [word[-n:] for n in range(3, len(word) + 1)] for word in words
+        )
+    )
+    infix = Counter(
+        chain.from_iterable(
+            [
+                word[m : m + n]
+                for n in range(3, len(word) + 1)
+                for m in range(1, len(word) - n)
+            ]
+            for word in words
+        )
+    )
+    return {"prefix": prefix, "infix": infix, "suffix": suffix}
+
+
+def ngram_probabilities(
+    counts: Mapping[str, Mapping[str, int]]
+) -> Dict[str, Dict[str, float]]:
+    """Return the probability of each ngram being a prefix, infix or suffix.
+
+    Args:
+        counts: Prefix, infix and suffix counts as returned by count_ngrams.
+    """
+    totals = Counter()
+    for kind in NGRAM_KINDS:
+        totals.update(counts[kind])
+    return {
+        kind: {ngram: count / totals[ngram] for ngram, count in counts[kind].items()}
+        for kind in NGRAM_KINDS
+    }
+
+
+class CarefulModel(NamedTuple):
+    """Careful model trained from a lemma file."""
+
+    counts: Dict[str, Counter]
+    probabilities: Dict[str, Dict[str, float]]
+    lemmas: LemmaLexicon
+
+
+def read_lemma_file(
+    lemma_file: str | Path, delimiter: str = ";", column: int = 0
+) -> Iterator[str]:
+    """Yield the unique lemmas in a column of a delimited lemma file.
+
+    The file is read line by line. Empty lines and lines without the column
+    are skipped.
+
+    Args:
+        lemma_file: Path of the lemma file.
+        delimiter: Column delimiter.
+        column: Index of the lemma column.
+    """
+    seen = set()
+    with open(lemma_file, encoding="utf8", newline="") as f:
+        for row in csv.reader(f, delimiter=delimiter):
+            if len(row) > column and row[column] and row[column] not in seen:
+                seen.add(row[column])
+                yield row[column]
+
+
+def train_careful(
+    lemma_file: str | Path, delimiter: str = ";", column: int = 0
+) -> CarefulModel:
+    """Train the careful model on a lemma file in one pass.
+
+    Args:
+        lemma_file: Path of the lemma file.
+        delimiter: Column delimiter.
+        column: Index of the lemma column.
+
+    Returns:
+        The ngram counts and probabilities and the lemmas.
+
+    Raises:
+        ValueError: If no lemmas are found.
+    """
+    lemmas = list(read_lemma_file(lemma_file, delimiter, column))
+    if not lemmas:  # assume its an error if no full forms can be found
+        raise ValueError(
+            f"Cannot process full forms in {lemma_file} "
+            f"with delimiter '{delimiter}' and column '{column}'"
+        )
+    counts = count_ngrams(lemmas)
+    return CarefulModel(counts, ngram_probabilities(counts), LemmaLexicon(lemmas))
 
 
 def argparser():
@@ -33,9 +148,9 @@ def train_splitter(
     column: int = 0,
     force_training: bool = False,
 ) -> str:
-    probality_file = f"{lang}_{output_name}_prob.json"
-    if not output_dir:
-        probality_file = os.path.join(tempfile.gettempdir(), probality_file)
+    probality_file = os.path.join(
+        output_dir or tempfile.gettempdir(), f"{lang}_{output_name}_prob.json"
+    )
     # If file exists, we assume it is already trained
     if not force_training and os.path.isfile(probality_file):
         print(f"File {probality_file} already exists. Skipping training.")
@@ -51,34 +166,10 @@ def train_splitter(
         lemma_file = str(current_dir / lemma_file)
     if not os.path.exists(lemma_file):
         raise FileNotFoundError(f"Cannot find file {lemma_file}")
-    lemmas = pd.read_csv(lemma_file, sep=delimiter, usecols=[column], names=["lemma"])
-    lemmas = (
-        lemmas.lemma.drop_duplicates().astype(str).values
-    )  # remove duplicates and return as array
-    length = len(lemmas)
-
-    if not length:  # assume its an error if no full forms can be found
-        raise ValueError(
-            f"Cannot process full forms in {lemma_file} "
-            f"with delimiter '{delimiter}' and column '{column}"
-        )
+    model = train_careful(lemma_file, delimiter, column)
 
-    with tempfile.TemporaryDirectory() as td:  # tmp dir as windows cant reopen a tmp file
-        f_name = os.path.join(td, "test")
-        with open(f_name, "w", encoding="utf8") as fh:
-            for form in lemmas:
-                fh.write(form + "\n")
-
-        # language "da" is hardkodet into the name for now
-        training.main(f_name, probality_file, max_words=length)
-
-        # CharSplit saves the file with utf-8 encoding, but with ascii characters
-        # We redo the save with ensure_ascii=False to get the correct encoding
-        with open(probality_file) as f:
-            ngram_probs = json.load(f)
-        with open(probality_file, "w") as f:
-            str_version = json.dumps(ngram_probs, ensure_ascii=False)
-            f.write(str_version)
+    with open(probality_file, "w", encoding="utf8") as f:
+        json.dump(model.probabilities, f, ensure_ascii=False)
     return probality_file
 
 
@@ -11,4 +11,5 @@ setup(
     packages=find_packages(),  # __init__.py folders search
     install_requires=requirements,
     include_package_data=True,
+    entry_points={"console_scripts": ["dslsplit=dslsplit.cli:main"]},
 )